@@ -5,30 +5,113 @@ Assignment: Python Tkinter GUI Application Project
 Description: Program creates a simple budgeting application with categories and a transaction history page.
 """
 
+import time
+IMPORT_START = time.perf_counter() # for --startup-report
+
+import importlib
+import os
+import sys
 import tkinter as tk
-from tkinter import ttk
-import tkinter.messagebox
+from tkinter import ttk # Combobox is in the first frame, everything else loads after it is drawn
+from budgetbuddy_core import Budget_Ledger # validation, storage and totals
+from budgetbuddy_ledger import INCOME_CATEGORIES, EXPENSE_CATEGORIES
+from budgetbuddy_assets import load_image # images are decoded once per process
+from budgetbuddy_undo import ADD, DELETE, EDIT
+
+IMPORT_END = time.perf_counter()
+
+LEDGER_FILE = "budgetbuddy.ledger" # saved transactions, next to the images
+COMMIT_INTERVAL_MS = 1000 # longest a submitted transaction waits before it is fsynced
+BUILD_INTERVAL_MS = 1 # gap between deferred build steps, lets input and redraws in between
+INSTRUMENTED_HANDLERS = ["submit_entry", "submit_batch", "update_categories", "open_transaction_window", "open_reports_window", "apply_import_batch", "undo_entry", "redo_entry", "drain_ingest", "build_ledger"]
+ACTION_NAMES = {ADD: "add", DELETE: "delete", EDIT: "edit"} # for the summary label after an undo or redo
+SECONDARY_MODULES = ["tkinter.messagebox", "tkinter.filedialog", "budgetbuddy_history", "budgetbuddy_import", "budgetbuddy_reports"] # warmed up after the first paint
 
 class Budget_Buddy:
     """A simple budgeting application"""
-    def __init__(self, root):
+    def __init__(self, root, ledger_path=LEDGER_FILE, startup_report=False, diagnostics=False, serve=False):
         """Initialize Window and Global Variables"""
+        self.timings = {} # startup phase -> seconds
+        self.startup_report = startup_report # print timings and close once startup is done
+        started = time.perf_counter()
+
         # Create window and title
         self.root = root
         self.root.title("Budget Buddy")
         self.root.resizable(False, False)
+        self.root.protocol("WM_DELETE_WINDOW", self.close) # save before the window goes away
 
         # Category Variables
         self.transaction_type = tk.StringVar(value="Income") # set default transaction type to Income so category dropdown is populated
-        self.income_categories = ["Salary", "Investments", "Miscellaneous"] 
-        self.expense_categories = ["Bills", "Food", "Entertainment"]
-        self.total = 0
-        self.transactions_list = [] # list for transaction storage
+        self.income_categories = INCOME_CATEGORIES
+        self.expense_categories = EXPENSE_CATEGORIES
+        self.ledger = Budget_Ledger(self.income_categories, self.expense_categories, ledger_path) # loads saved transactions
+        self.timings["ledger load"] = time.perf_counter() - started
+        self.transactions = self.ledger.store # compact transaction storage, read by the history window
+        self.total = self.ledger.total()
+        self.transactions_window = None # the one history window, kept until closed
+        self.reports_window = None # same for reports
+        self.analytics = None # report cache, created on first use and kept so reopening is instant
+        self.serve = serve # start the local HTTP service once the window is up
+        self.ingest = None # the running Ingest_Service
+
+        # Define category colors
+        self.category_colors = {
+            "Salary" : "#DFF2BF",          # light green
+            "Investments" : "#498AE3",     # light blue 
+            "Miscellaneous" : "#177F75",   # blue-green
+            "Bills" : "#E58A9B",           # Monopoly Bill Pink
+            "Food" : "#FFBF7E",            # light orange
+            "Entertainment" : "#d19ff3",   # light purple
+        }
+
+        # Optional instrumentation, handlers are only wrapped when it is on so it costs nothing otherwise
+        self.instrumentation = None
+        if diagnostics:
+            from budgetbuddy_diagnostics import Instrumentation
+            self.instrumentation = Instrumentation(self.root)
+            self.instrumentation.instrument(self, INSTRUMENTED_HANDLERS) # before create_buttons binds them
 
         # Begin button creation and set default selections with update
+        widgets_started = time.perf_counter()
         self.create_buttons()
-        self.add_images() # add images or alt text if not found
         self.update_categories() # sets first dropdown set on app start
+        if len(self.transactions):
+            self.update_total_label() # show the saved total right away
+        self.timings["widget construction"] = time.perf_counter() - widgets_started
+        self.ledger.subscribe_changes(self.rows_changed) # edits and deletes from the history window move the total too
+        self.root.after(COMMIT_INTERVAL_MS, self.commit_ledger)
+
+        # Idle callbacks run after the pending redraws, the timer then lets the first frame reach the screen
+        self.root.after_idle(self.root.after, 0, self.load_deferred, started)
+
+    def load_deferred(self, started):
+        """Runs once the first frame is drawn, loads the logo and warms up modules the buttons need later"""
+        self.timings["first paint"] = time.perf_counter() - started
+        deferred_started = time.perf_counter()
+        self.add_images() # add images or alt text if not found
+        for module in SECONDARY_MODULES:
+            importlib.import_module(module)
+        self.timings["deferred loading"] = time.perf_counter() - deferred_started
+        self.build_ledger()
+        if self.serve:
+            self.start_ingest()
+        if self.instrumentation:
+            from budgetbuddy_diagnostics import Diagnostics_Panel
+            self.instrumentation.start_lag_probe()
+            Diagnostics_Panel(self.root, self.instrumentation)
+        if self.startup_report:
+            self.print_startup_report()
+            self.close()
+
+    def print_startup_report(self):
+        """Breakdown for --startup-report"""
+        print("Budget Buddy startup report")
+        print(f"  {'imports':<22}{(IMPORT_END - IMPORT_START) * 1000:8.1f} ms")
+        for phase in ["Tk root", "ledger load", "widget construction", "first paint", "deferred loading"]:
+            if phase in self.timings:
+                print(f"  {phase:<22}{self.timings[phase] * 1000:8.1f} ms")
+        print(f"  ({len(self.transactions)} transactions, first paint is measured from the start of Budget_Buddy)")
 
     def create_buttons(self):
         """Welcome to the button factory, also includes input field for $"""
@@ -61,14 +144,23 @@ class Budget_Buddy:
 
         self.view_transactions_button = tk.Button(self.root, text="View Transaction History", command=self.open_transaction_window)
         self.view_transactions_button.grid(row=8, columnspan=2)
+
+        self.import_button = tk.Button(self.root, text="Import Bank File", command=self.import_file)
+        self.import_button.grid(row=9, columnspan=2, pady=5)
+
+        self.reports_button = tk.Button(self.root, text="View Reports", command=self.open_reports_window)
+        self.reports_button.grid(row=10, columnspan=2, pady=5)
+
+        self.undo_button = tk.Button(self.root, text="Undo", command=self.undo_entry)
+        self.undo_button.grid(row=11, column=0, pady=5)
+
+        self.redo_button = tk.Button(self.root, text="Redo", command=self.redo_entry)
+        self.redo_button.grid(row=11, column=1, pady=5)
+        self.bind_shortcuts(self.root)
     
     def add_images(self):
         """Adds image to main window, alternate text if not found"""
-        try:
-            self.image_main = tk.PhotoImage(file="budgetbuddylogo.png")
-        except Exception as i:
-            print(f"Error loading logo image: {i}") # display logo image error
-            self.image_main = None # set to none
+        self.image_main = load_image("budgetbuddylogo.png", "logo") # None if not found
 
         # Labels for images and alt text
         self.image_main_label = tk.Label(self.root, image=self.image_main, compound="center") # set label as image
@@ -98,44 +190,153 @@ class Budget_Buddy:
         self.amount_entry.delete(0, tk.END) # clears entry field, (start, end)
         self.category_combobox.set("") # resets category field
 
-        # Check if all fields have been filled. If not, popout message
-        if not category or not amount:
-            tkinter.messagebox.showerror("Error", "Please select a category and enter an amount.") # (Title, Message)
+        # The ledger checks the fields with the same rules the importer uses, popout message if something is off
+        try:
+            self.ledger.submit(transaction_type, category, amount)
+        except ValueError as error:
+            from tkinter import messagebox # loaded on first use, kept out of startup
+            messagebox.showerror("Error", str(error)) # (Title, Message)
         else:
-            try:
-                amount = float(amount) # convert input to float for computing
-                if amount < 0: # check for negative input
-                    tkinter.messagebox.showerror("Error", "Please enter a positive dollar amount. (Select Expense if not Income)")
-                    return
-            except ValueError:
-                tkinter.messagebox.showerror("Error", "Please enter a numeric amount.")
-                return
-            self.transactions_list.append((transaction_type, category, amount)) # add transaction to running list
-            if transaction_type == "Income":
-                self.total += amount
-            else:
-                self.total -= amount # subtract if income is not selected
+            amount = float(amount) # float for the summary text
             self.summary_label.config(text=f"{transaction_type} - {category}: ${amount}") # show summary of recent transaction
-            
-            # Color logic for running total 
-            if self.total < 0:
-                self.total_label.config(text=f"Total Finances: ${self.total:.2f}", background="red") # turn background red if negative
-            elif self.total > 0:
-                self.total_label.config(text=f"Total Finances: ${self.total:.2f}", background="green") # remain green if positive
-            else:
-                self.total_label.config(text=f"Total Finances: ${self.total:.2f}", background="yellow") # turn yellow if recently hitting zero
+            self.update_total_label()
+
+    def submit_batch(self, types, categories, amounts, days=None):
+        """Submit columns of transactions at once, labels and total color are updated once at the end"""
+        rejected = self.ledger.submit_batch(types, categories, amounts, days)
+        self.summary_label.config(text=f"Submitted {len(amounts) - len(rejected)} transactions") # show summary of the batch
+        self.update_total_label()
+        if rejected: # one popout for the whole batch instead of one per bad row
+            details = "\n".join(f"Row {index + 1}: {reason}" for index, reason in rejected[:10])
+            more = f"\n...and {len(rejected) - 10} more" if len(rejected) > 10 else ""
+            from tkinter import messagebox
+            messagebox.showerror("Error", f"{len(rejected)} transactions were rejected.\n{details}{more}")
+        return rejected
+
+    def bind_shortcuts(self, window):
+        """Ctrl+Z and Ctrl+Y anywhere in a toplevel, the history window binds them too"""
+        window.bind("<Control-z>", lambda event: self.shortcut(event, self.undo_entry))
+        window.bind("<Control-y>", lambda event: self.shortcut(event, self.redo_entry))
+
+    def shortcut(self, event, handler):
+        """Run a shortcut's handler unless it was typed into an entry (ttk entries and comboboxes are tk.Entry too)"""
+        if not isinstance(event.widget, tk.Entry):
+            handler()
+
+    def undo_entry(self, event=None):
+        """Handler for 'Undo' and Ctrl+Z, reverses the last submit, import batch, edit or delete"""
+        undone = self.ledger.undo()
+        self.summary_label.config(text=f"Undid {ACTION_NAMES[undone[1]]}" if undone else "Nothing to undo")
+
+    def redo_entry(self, event=None):
+        """Handler for 'Redo' and Ctrl+Y"""
+        redone = self.ledger.redo()
+        self.summary_label.config(text=f"Redid {ACTION_NAMES[redone[1]]}" if redone else "Nothing to redo")
+
+    def rows_changed(self, rows):
+        """Ledger change listener, the total label follows deletes, edits, undo and redo"""
+        self.update_total_label()
+
+    def import_file(self):
+        """Handler for 'Import Bank File', streams a CSV or OFX export in without freezing the window"""
+        from tkinter import filedialog
+        from budgetbuddy_import import Import_Job, Import_Window # bank export import
+        path = filedialog.askopenfilename(parent=self.root, title="Import Bank File",
+                                          filetypes=[("Bank exports", "*.csv *.ofx *.qfx"), ("All files", "*.*")])
+        if not path:
+            return # cancelled
+        self.import_button.config(state="disabled") # one import at a time
+        Import_Window(self.root, Import_Job(self.transactions, path), self.apply_import_batch, self.import_done)
+
+    def apply_import_batch(self, columns):
+        """Add one validated batch from the importer, labels are refreshed once per batch"""
+        self.ledger.extend(*columns)
+        self.summary_label.config(text=f"Imported {len(columns[2])} transactions")
+        self.update_total_label()
+
+    def import_done(self, job, imported, error):
+        """Report how the import went, rejected rows are saved to a report file"""
+        self.import_button.config(state="normal")
+        self.ledger.commit()
+        message = f"Imported {imported} transactions."
+        if job.rejected:
+            report_path = job.write_report()
+            message += f"\n{len(job.rejected)} rows were rejected, see {report_path}"
+        from tkinter import messagebox
+        if error:
+            messagebox.showerror("Import Error", f"{message}\nImport stopped early: {error}")
+        else:
+            messagebox.showinfo("Import Complete", message)
+
+    def update_total_label(self):
+        """Show the running total, colored by sign, GET /total answers with the same number"""
+        self.total = self.ledger.total()
+        if self.ingest:
+            self.ingest.update_totals(self.ledger)
+
+        # Color logic for running total 
+        if self.total < 0:
+            self.total_label.config(text=f"Total Finances: ${self.total:.2f}", background="red") # turn background red if negative
+        elif self.total > 0:
+            self.total_label.config(text=f"Total Finances: ${self.total:.2f}", background="green") # remain green if positive
+        else:
+            self.total_label.config(text=f"Total Finances: ${self.total:.2f}", background="yellow") # turn yellow if recently hitting zero
+
+    def commit_ledger(self):
+        """Timer that fsyncs submitted transactions in groups instead of one at a time"""
+        self.ledger.commit()
+        self.root.after(COMMIT_INTERVAL_MS, self.commit_ledger)
+
+    def build_ledger(self):
+        """Timer that does the ledger's deferred work a slice at a time, so a large ledger opens without waiting for it"""
+        if not self.ledger.build_step():
+            self.root.after(BUILD_INTERVAL_MS, self.build_ledger)
+
+    def start_ingest(self):
+        """Start the local HTTP service, posts are drained into the ledger on a timer"""
+        from budgetbuddy_server import Ingest_Service, DRAIN_MS
+        self.ingest = Ingest_Service(self.ledger.store)
+        self.ingest.update_totals(self.ledger)
+        try:
+            self.ingest.start()
+        except OSError as error:
+            print(f"Error starting ingestion service: {error}") # same as other startup errors, print and carry on
+            self.ingest = None
+            return
+        self.root.after(DRAIN_MS, self.drain_ingest, DRAIN_MS)
+
+    def drain_ingest(self, interval):
+        """Timer that adds everything posted since the last tick as one batch, labels update once per tick"""
+        added = self.ingest.drain(self.ledger)
+        if added:
+            self.summary_label.config(text=f"Received {added} transactions")
+            self.update_total_label()
+        self.root.after(interval, self.drain_ingest, interval)
+
+    def close(self):
+        """Handler for closing the main window, commits the ledger file first"""
+        if self.ingest:
+            self.ingest.stop()
+        self.ledger.close()
+        self.root.destroy()
 
     def open_transaction_window(self):
         """Handler for when 'View Transaction History' button is pressed"""
+        # Already open, it keeps itself up to date so just bring it to the front
+        if self.transactions_window is not None:
+            self.transactions_window.deiconify() # in case it was minimized
+            self.transactions_window.lift()
+            self.transactions_window.focus_set()
+            return
+
         transactions_window = tk.Toplevel(self.root)
         transactions_window.title("Transaction History")
+        transactions_window.protocol("WM_DELETE_WINDOW", self.close_transaction_window)
+        self.bind_shortcuts(transactions_window)
+        self.transactions_window = transactions_window
 
-        # try load image 
-        try:
-            self.image_search = tk.PhotoImage(file="search.png") 
-        except Exception as i:
-            print(f"Error loading transaction history image: {i}")
-            self.image_search = None # set to none
+        # load image, decoded once and then served from the cache
+        self.image_search = load_image("search.png", "transaction history")
 
         # Create frame for image and title
         frame = tk.Frame(transactions_window) # add frame to window
@@ -153,24 +354,50 @@ class Budget_Buddy:
             self.image_search_label.config(text="[Image: Search icon]") # alt text
             self.image_search_label.pack(side=tk.LEFT) 
 
-        # Define category colors
-        category_colors = {
-            "Salary" : "#DFF2BF",          # light green
-            "Investments" : "#498AE3",     # light blue 
-            "Miscellaneous" : "#177F75",   # blue-green
-            "Bills" : "#E58A9B",           # Monopoly Bill Pink
-            "Food" : "#FFBF7E",            # light orange
-            "Entertainment" : "#d19ff3",   # light purple
-        }
+        # Only the rows in view get drawn, so this opens just as fast with a million transactions
+        from budgetbuddy_history import History_Search # searchable, scrollable history list
+        history_search = History_Search(transactions_window, self.ledger, self.history_row)
+        history_search.pack(fill="both", expand=True)
+        if self.instrumentation:
+            self.instrumentation.instrument(history_search, ["run_search"])
+
+    def close_transaction_window(self):
+        """Handler for closing the history window, the next click builds a fresh one"""
+        self.transactions_window.destroy() # history list unsubscribes from the ledger on destroy
+        self.transactions_window = None
+
+    def open_reports_window(self):
+        """Handler for 'View Reports', monthly rollups, trends and forecast"""
+        if self.reports_window is not None:
+            self.reports_window.deiconify()
+            self.reports_window.lift()
+            return
+        from budgetbuddy_analytics import Analytics
+        from budgetbuddy_reports import Reports_Window
+        if self.analytics is None:
+            self.analytics = Analytics(self.ledger)
+        self.reports_window = Reports_Window(self.root, self.analytics)
+        self.reports_window.protocol("WM_DELETE_WINDOW", self.close_reports_window)
+
+    def close_reports_window(self):
+        """Handler for closing the reports window"""
+        self.reports_window.destroy()
+        self.reports_window = None
 
-        for index, (transaction_type, category, amount) in enumerate(self.transactions_list): # enumerate "numbers" the transactions in the list, creating tuples
-            background_color = category_colors.get(category, "#FFFFFF") # get color for current category, default is white
-            transaction_text = f"{index + 1}: {transaction_type} - {category}: ${amount}" # setup for transaction layout and add +1 to index since start zero
-            transaction_label = tk.Label(transactions_window, text=transaction_text, anchor="w", justify="left", bg = background_color) # align to left side of window, assign color
-            transaction_label.pack(fill="x", padx=5, pady=2) # fills out width of window
+    def history_row(self, index):
+        """Text and background color for one row of the transaction history"""
+        transaction_type, category, amount = self.transactions[index]
+        background_color = self.category_colors.get(category, "#FFFFFF") # get color for current category, default is white
+        transaction_text = f"{index + 1}: {transaction_type} - {category}: ${amount}" # setup for transaction layout and add +1 to index since start zero
+        return transaction_text, background_color
             
 if __name__ == "__main__":
+    root_started = time.perf_counter()
     root = tk.Tk()
-    app = Budget_Buddy(root)
+    root_time = time.perf_counter() - root_started
+    app = Budget_Buddy(root, startup_report="--startup-report" in sys.argv, # --startup-report prints timings and exits
+                       diagnostics="--diagnostics" in sys.argv or bool(os.environ.get("BUDGETBUDDY_DIAGNOSTICS")), # handler timings and event-loop lag
+                       serve="--serve" in sys.argv) # local HTTP/JSON entry point, see budgetbuddy_server.py
+    app.timings["Tk root"] = root_time
     root.mainloop()
 # End of Program
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""Running totals by type, category and day, updated on every insert"""
+
+import calendar
+import json
+import os
+import zlib
+from datetime import date
+from itertools import compress, repeat
+from operator import add, and_, mul
+from budgetbuddy_ledger import EPOCH_ORDINAL, DAY_LIMIT
+
+DEFERRED_ROWS = 100000 # a catch-up larger than this only updates the type totals, build_trees() fills in the rest later
+FINGERPRINT_ROWS = 64 # rows read from each end of the ledger to tell it apart from another one the same size
+
+def day_number(year, month, day):
+    """Calendar date to the day numbers stored in the ledger"""
+    return date(year, month, day).toordinal() - EPOCH_ORDINAL
+
+def month_days(year, month):
+    """First and last day number of a month"""
+    return day_number(year, month, 1), day_number(year, month, calendar.monthrange(year, month)[1])
+
+def month_of(day):
+    """(year, month) a day number falls in"""
+    calendar_date = date.fromordinal(day + EPOCH_ORDINAL)
+    return calendar_date.year, calendar_date.month
+
+class Fenwick_Tree:
+    """Prefix sums over day numbers, O(log n) to add to a day or sum a range of days"""
+    def __init__(self, size):
+        """Tree covering days 0 to size-1, all zero"""
+        self.tree = [0] * (size + 1) # 1-based, tree[i] holds the sum of days (i - lowbit(i), i]
+
+    def __len__(self):
+        """Number of days covered"""
+        return len(self.tree) - 1
+
+    def add(self, day, value):
+        """Add value to one day, grows the tree for days past the end but never past the last day the ledger accepts"""
+        if day >= len(self):
+            self.grow(max(day + 1, min(2 * len(self), DAY_LIMIT)))
+        tree = self.tree
+        size = len(tree)
+        index = day + 1
+        while index < size:
+            tree[index] += value
+            index += index & -index
+
+    def prefix(self, end):
+        """Sum of days [0, end)"""
+        total = 0
+        index = min(end, len(self))
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def range_sum(self, first, last):
+        """Sum of days first to last, both included"""
+        return self.prefix(last + 1) - self.prefix(first)
+
+    def grow(self, size):
+        """Extend to 'size' days, only the new nodes are filled in"""
+        old = len(self)
+        self.tree.extend([0] * (size - old))
+        for index in range(old + 1, size + 1):
+            low = index - (index & -index) # node covers (low, index], only the part up to old has data
+            if low < old:
+                self.tree[index] = self.prefix(old) - self.prefix(low)
+
+class Aggregates:
+    """Per-category and per-type totals plus a Fenwick tree per category over days
+
+    The type totals always cover every row. Category totals and the trees can
+    lag behind after a large catch-up (a ledger opened without a checkpoint),
+    anything that reads them calls build_trees() first.
+    """
+    def __init__(self, store):
+        """Empty totals using the store's category tables"""
+        self.store = store
+        self.rows = 0 # rows of the store folded into the type totals so far
+        self.tree_rows = 0 # rows folded into the category totals and trees, at most self.rows
+        self.category_cents = [0] * len(store.category_names)
+        self.day_sums = {} # (day * 256 + category code) -> cents summed by build_trees() steps, added to the trees once they are complete
+        self.type_cents = [0] * len(store.type_names)
+        today = date.today().toordinal() - EPOCH_ORDINAL
+        self.by_day = [Fenwick_Tree(today + 366) for _ in store.category_names] # room until next year before growing
+        self.selectors = [bytes(code == category_code for code in range(256)) for category_code in range(len(store.category_names))] # translate tables, category column -> 1/0 mask
+
+    def add_rows(self, start, stop):
+        """Fold live store rows [start, stop) into the type totals, the category totals and the trees"""
+        self.add_totals(start, stop)
+        self.add_trees(start, stop)
+
+    def add_totals(self, start, stop):
+        """Fold live store rows [start, stop) into the type totals, one C-level compress() pass per type"""
+        store = self.store
+        with store.column_views() as (types, _, cents, _):
+            types = types[start:stop].tobytes() # translate() needs bytes, one byte a row
+            for type_code in set(types):
+                selector = types.translate(self.selectors[type_code]) # type codes are small too, the same tables work
+                if store.dead:
+                    selector = bytes(map(and_, selector, store.live[start:stop]))
+                self.type_cents[type_code] += sum(compress(cents[start:stop], selector))
+        self.rows = stop
+
+    def add_trees(self, start, stop):
+        """Fold live store rows [start, stop) into the category totals and trees, each (category, day) pair only touches its tree once"""
+        store = self.store
+        live = store.live[start:stop] if store.dead else None
+        with store.column_views() as (_, categories, cents, days):
+            days = days[start:stop]
+            if days and min(days) == max(days):
+                self.add_same_day(days[0], start, stop, live)
+            else:
+                day_sums = self.day_sums
+                get = day_sums.get
+                keys = map(add, map(mul, days, repeat(256)), categories[start:stop]) # day * 256 + category code, built in C and cheaper to hash than a tuple
+                rows = zip(keys, cents[start:stop])
+                for key, row_cents in compress(rows, live) if live else rows:
+                    day_sums[key] = get(key, 0) + row_cents
+        self.tree_rows = stop
+        if stop == self.rows: # a build done in steps touches each (category, day) once at the end, not once per step
+            self.flush_day_sums()
+
+    def flush_day_sums(self):
+        """Add the sums add_trees() collected to the trees and category totals"""
+        for key, cents in self.day_sums.items():
+            day, category_code = divmod(key, 256)
+            self.by_day[category_code].add(day, cents)
+            self.category_cents[category_code] += cents
+        self.day_sums = {}
+
+    def add_row(self, row, sign):
+        """Add (sign 1) or take out (sign -1) one row, used when a row is deleted or brought back, O(log n)
+
+        Only the totals the row was already folded into change, rows past them are
+        skipped by the catch-up if they are dead by then.
+        """
+        store = self.store
+        cents = sign * store.cents[row]
+        if row < self.rows:
+            self.type_cents[store.types[row]] += cents
+        if row < self.tree_rows:
+            category_code = store.categories[row]
+            self.by_day[category_code].add(store.days[row], cents)
+            self.category_cents[category_code] += cents
+
+    def add_same_day(self, day, start, stop, live=None):
+        """Fast path for rows dated one day, each category is summed with a C-level compress() pass"""
+        with self.store.column_views() as (_, categories, cents, _):
+            categories = categories[start:stop].tobytes()
+            for category_code in set(categories):
+                selector = categories.translate(self.selectors[category_code])
+                category_sum = sum(compress(cents[start:stop], map(and_, selector, live) if live else selector))
+                self.by_day[category_code].add(day, category_sum)
+                self.category_cents[category_code] += category_sum
+
+    def catch_up(self):
+        """Fold in any store rows added since the last call, a large batch only reaches the trees through build_trees()"""
+        start, stop = self.rows, len(self.store)
+        if start < stop:
+            self.add_totals(start, stop)
+            if self.tree_rows == start and stop - start <= DEFERRED_ROWS:
+                self.add_trees(start, stop)
+
+    def build_trees(self, limit=None):
+        """Fold at most 'limit' rows the trees are missing into them (all of them by default), returns True once they are complete"""
+        stop = self.rows if limit is None else min(self.rows, self.tree_rows + limit)
+        if self.tree_rows < stop:
+            self.add_trees(self.tree_rows, stop)
+        return self.tree_rows == self.rows
+
+    def fingerprint(self, rows):
+        """Checksum of the first and last rows of store rows [0, rows), tells a checkpoint which ledger it belongs to"""
+        store = self.store
+        head = slice(0, min(rows, FINGERPRINT_ROWS))
+        tail = slice(max(0, rows - FINGERPRINT_ROWS), rows)
+        checksum = zlib.crc32(rows.to_bytes(8, "little"))
+        for column in (store.types, store.categories, store.cents, store.days):
+            checksum = zlib.crc32(column[tail].tobytes(), zlib.crc32(column[head].tobytes(), checksum))
+        return checksum
+
+    def total_cents(self):
+        """Income minus expenses, O(1)"""
+        return self.type_cents[0] - self.type_cents[1]
+
+    def category_total(self, category, first_day=None, last_day=None):
+        """Cents for one category, all time or between two day numbers (both included), O(log n)"""
+        category_code = self.store.category_codes[category]
+        self.build_trees()
+        if first_day is None and last_day is None:
+            return self.category_cents[category_code]
+        tree = self.by_day[category_code]
+        return tree.range_sum(first_day or 0, len(tree) if last_day is None else last_day)
+
+    def type_total(self, transaction_type, first_day=None, last_day=None):
+        """Cents for 'Income' or 'Expense', all time or between two day numbers"""
+        type_code = self.store.type_codes[transaction_type]
+        if first_day is None and last_day is None:
+            return self.type_cents[type_code]
+        return sum(self.category_total(category, first_day, last_day)
+                   for category, category_type in zip(self.store.category_names, self.store.category_types)
+                   if category_type == type_code)
+
+    def net(self, first_day=None, last_day=None):
+        """Income minus expenses between two day numbers"""
+        return self.type_total("Income", first_day, last_day) - self.type_total("Expense", first_day, last_day)
+
+    def save(self, path, extra=None):
+        """Checkpoint the totals so the next start only folds in rows added after this, 'extra' is saved alongside as is"""
+        self.build_trees()
+        state = {
+            "rows": self.rows,
+            "fingerprint": self.fingerprint(self.rows),
+            "categories": self.store.category_names,
+            "trees": [tree.tree for tree in self.by_day],
+            "extra": extra or {},
+        }
+        with open(path + ".tmp", "w") as checkpoint:
+            json.dump(state, checkpoint)
+        os.replace(path + ".tmp", path) # readers never see a half-written checkpoint
+
+    def load(self, path):
+        """Restore a checkpoint written by save(), returns its 'extra' dict, or None if it is missing or does not match the store"""
+        try:
+            with open(path) as checkpoint:
+                state = json.load(checkpoint)
+        except (OSError, ValueError):
+            return None
+        if (state["categories"] != self.store.category_names or state["rows"] > len(self.store)
+                or state.get("fingerprint") != self.fingerprint(state["rows"])):
+            return None # categories changed, the ledger was cut short or it is a different ledger, rebuild instead
+        for tree, saved in zip(self.by_day, state["trees"]):
+            tree.tree = saved
+        self.category_cents = [tree.prefix(len(tree)) for tree in self.by_day]
+        self.type_cents = [0] * len(self.store.type_names)
+        for category_code, cents in enumerate(self.category_cents):
+            self.type_cents[self.store.category_types[category_code]] += cents
+        self.rows = self.tree_rows = state["rows"]
+        return state.get("extra", {})
@@ -0,0 +1,105 @@
+"""Monthly rollups, trends and a month-end forecast, memoized per month"""
+
+from budgetbuddy_aggregates import month_days, month_of
+from budgetbuddy_ledger import today
+
+MOVING_AVERAGE_MONTHS = 3
+
+def moving_average(values, window=MOVING_AVERAGE_MONTHS):
+    """Trailing average over 'window' values, shorter at the start of the series"""
+    averages = []
+    running = 0
+    for index, value in enumerate(values):
+        running += value
+        if index >= window:
+            running -= values[index - window]
+        averages.append(running / min(index + 1, window))
+    return averages
+
+class Analytics:
+    """Report numbers read from the ledger's aggregates, a month is only recomputed when a transaction lands in it
+
+    Nothing here walks the transactions: a month is one Fenwick range query per
+    category, so the cost depends on the number of months, not on ledger size.
+    """
+    def __init__(self, ledger):
+        """Start with an empty cache and listen for new transactions"""
+        self.ledger = ledger
+        self.months = {} # (year, month) -> cents per category code
+        self.first_day = min(ledger.store.days) if len(ledger) else None # C-level passes, kept up to date after this
+        self.last_day = max(ledger.store.days) if len(ledger) else None
+        ledger.subscribe(self.rows_added)
+        ledger.subscribe_changes(self.rows_changed)
+
+    def rows_added(self, start, stop):
+        """Ledger listener, forgets only the months the new rows fall in"""
+        days = set(self.ledger.store.days[start:stop])
+        for month in {month_of(day) for day in days}:
+            self.months.pop(month, None)
+        if self.first_day is None:
+            self.first_day, self.last_day = min(days), max(days)
+        else:
+            self.first_day = min(self.first_day, min(days))
+            self.last_day = max(self.last_day, max(days))
+
+    def rows_changed(self, rows):
+        """Ledger change listener, forgets the months of deleted or restored rows"""
+        days = self.ledger.store.days
+        for month in {month_of(days[row]) for row in rows}:
+            self.months.pop(month, None)
+
+    def month_totals(self, year, month):
+        """Cents per category code for one month, memoized"""
+        key = (year, month)
+        if key not in self.months:
+            first_day, last_day = month_days(year, month)
+            aggregates = self.ledger.aggregates
+            aggregates.build_trees()
+            self.months[key] = [tree.range_sum(first_day, last_day) for tree in aggregates.by_day]
+        return self.months[key]
+
+    def month_keys(self):
+        """Every (year, month) from the first transaction to this month"""
+        if self.first_day is None:
+            return []
+        year, month = month_of(self.first_day)
+        last = max(month_of(today()), month_of(self.last_day))
+        keys = []
+        while (year, month) <= last:
+            keys.append((year, month))
+            year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+        return keys
+
+    def monthly_rollup(self):
+        """One dict per month: category cents, income, expense, net, savings rate and moving averages"""
+        store = self.ledger.store
+        rollup = []
+        for year, month in self.month_keys():
+            totals = self.month_totals(year, month)
+            income = sum(cents for cents, category_type in zip(totals, store.category_types) if category_type == 0)
+            expense = sum(totals) - income
+            rollup.append({
+                "month": (year, month),
+                "categories": dict(zip(store.category_names, totals)),
+                "income": income,
+                "expense": expense,
+                "net": income - expense,
+                "savings_rate": (income - expense) / income if income else None,
+            })
+        for name, key in (("average_expense", "expense"), ("average_net", "net")):
+            for row, average in zip(rollup, moving_average([row[key] for row in rollup])):
+                row[name] = average
+        return rollup
+
+    def forecast(self):
+        """Expected balance in cents at the end of this month, if the rest of the month goes like the days so far"""
+        current = today()
+        first_day, last_day = month_days(*month_of(current))
+        net_so_far = self.ledger.aggregates.net(first_day, current)
+        days_elapsed = current - first_day + 1
+        return self.ledger.aggregates.total_cents() + round(net_so_far / days_elapsed * (last_day - current))
+
+    def close(self):
+        """Stop listening to the ledger"""
+        self.ledger.unsubscribe(self.rows_added)
+        self.ledger.unsubscribe_changes(self.rows_changed)
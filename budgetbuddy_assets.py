@@ -0,0 +1,15 @@
+"""Process-wide image cache, each image file is decoded at most once"""
+
+import tkinter as tk
+
+IMAGE_CACHE = {} # file name -> PhotoImage, or None if it failed to load
+
+def load_image(file_name, description):
+    """Cached PhotoImage for file_name, None if it cannot be loaded (the error is printed once)"""
+    if file_name not in IMAGE_CACHE:
+        try:
+            IMAGE_CACHE[file_name] = tk.PhotoImage(file=file_name)
+        except Exception as i:
+            print(f"Error loading {description} image: {i}") # display image error
+            IMAGE_CACHE[file_name] = None # set to none, not retried
+    return IMAGE_CACHE[file_name]
@@ -0,0 +1,236 @@
+"""Benchmark suite for Budget Buddy, run with: python budgetbuddy_benchmark.py [--sizes 10000,1000000,10000000] [--json results.json]"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from budgetbuddy_aggregates import month_days
+from budgetbuddy_core import Budget_Ledger
+from budgetbuddy_ledger import Ledger_Store, INCOME_CATEGORIES, EXPENSE_CATEGORIES, today
+from budgetbuddy_search import Search_Index
+
+BLOCK_ROWS = 65536 # synthetic columns repeat a random block this long
+SUBMIT_ROWS = 100000 # single submits are slow enough that a sample is plenty
+BATCH_ROWS = 1000000 # largest batch handed to submit_batch, the input lists alone are big
+QUERY_REPEAT = 1000 # each query benchmark runs this many times
+INGEST_CLIENTS = 50 # concurrent keep-alive connections posting to the local service
+INGEST_POSTS = 200 # single-transaction posts per connection
+
+def synthetic_rows(rows, seed=2024):
+    """Yield (type, category, amount, day) rows with a fixed seed so runs are comparable"""
+    rng = random.Random(seed)
+    last_day = today()
+    for _ in range(rows):
+        day = last_day - rng.randrange(3 * 365) # spread over three years
+        if rng.random() < 0.3:
+            yield "Income", rng.choice(INCOME_CATEGORIES), round(rng.uniform(10, 5000), 2), day
+        else:
+            yield "Expense", rng.choice(EXPENSE_CATEGORIES), round(rng.uniform(1, 500), 2), day
+
+def synthetic_columns(rows):
+    """(types, categories, cents, days) code columns for 'rows' rows, built by repeating one random block"""
+    store = Ledger_Store(INCOME_CATEGORIES, EXPENSE_CATEGORIES)
+    for row in synthetic_rows(min(rows, BLOCK_ROWS)):
+        store.append(*row)
+    repeats, extra = divmod(rows, len(store))
+    return tuple(column * repeats + column[:extra] for column in (store.types, store.categories, store.cents, store.days))
+
+def build_tuple_list(rows):
+    """Old storage, one (type, category, float) tuple per transaction"""
+    transactions = []
+    for transaction_type, category, amount, _ in synthetic_rows(rows):
+        transactions.append((transaction_type, category, amount))
+    return transactions
+
+def build_ledger_store(rows):
+    """New storage, typed columns"""
+    store = Ledger_Store(INCOME_CATEGORIES, EXPENSE_CATEGORIES)
+    for row in synthetic_rows(rows):
+        store.append(*row)
+    return store
+
+def measure_memory(build, rows):
+    """Bytes still allocated after building, and build time in seconds"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(rows)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory() # generator garbage is freed by now, only the result is left
+    tracemalloc.stop()
+    del result
+    return current, elapsed
+
+def timed(function, repeat=1):
+    """Seconds for one call, best of 'repeat' calls"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_memory(rows):
+    """Memory of the tuple list against Ledger_Store"""
+    results = []
+    for name, build in (("tuple_list", build_tuple_list), ("ledger_store", build_ledger_store)):
+        used, _ = measure_memory(build, rows)
+        results.append((f"memory_{name}", used / rows, "bytes/row"))
+    return results
+
+def bench_submit(rows):
+    """Validated single submits, like clicking Submit"""
+    ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES)
+    sample = list(synthetic_rows(min(rows, SUBMIT_ROWS)))
+    start = time.perf_counter()
+    for transaction_type, category, amount, day in sample:
+        ledger.submit(transaction_type, category, amount, day)
+    return [("submit", len(sample) / (time.perf_counter() - start), "rows/s")]
+
+def bench_batch_submit(rows):
+    """Vectorized validation plus aggregation of already parsed columns dated over three years, deferred tree building included"""
+    ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES)
+    sample = list(synthetic_rows(min(rows, BLOCK_ROWS)))
+    count = min(rows, BATCH_ROWS)
+    repeats = -(-count // len(sample))
+    types, categories, amounts, days = ([row[column] for row in sample] * repeats for column in range(4))
+
+    def submit(): # a batch over DEFERRED_ROWS leaves the trees to build_trees(), that work counts too
+        ledger.submit_batch(types[:count], categories[:count], amounts[:count], days[:count])
+        ledger.aggregates.build_trees()
+    return [("batch_submit", count / timed(submit), "rows/s")]
+
+def bench_bulk_insert(rows, ledger, columns):
+    """Pre-encoded columns added in one call, like an import batch"""
+    elapsed = timed(lambda: ledger.extend(*columns))
+    return [("bulk_insert", rows / elapsed, "rows/s")]
+
+def bench_queries(ledger):
+    """Total, date range and monthly report queries against the aggregates"""
+    aggregates = ledger.aggregates
+    first_day, last_day = month_days(datetime.now().year, datetime.now().month)
+    results = [
+        ("query_total", timed(ledger.total, QUERY_REPEAT) * 1e6, "us"),
+        ("query_category_range", timed(lambda: aggregates.category_total("Food", last_day - 90, last_day), QUERY_REPEAT) * 1e6, "us"),
+        ("query_net_month", timed(lambda: aggregates.net(first_day, last_day), QUERY_REPEAT) * 1e6, "us"),
+    ]
+
+    def monthly_report(): # every category for each of the last 36 months
+        year, month = datetime.now().year, datetime.now().month
+        for _ in range(36):
+            first, last = month_days(year, month)
+            for category in ledger.store.category_names:
+                aggregates.category_total(category, first, last)
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    results.append(("query_monthly_report", timed(monthly_report, 10) * 1e3, "ms"))
+    results.append(("search_index_build", timed(lambda: Search_Index(ledger.store).catch_up()) * 1e3, "ms")) # the ledger's own index is already built
+    results.append(("query_search", timed(lambda: ledger.search("Expense", "Food", 10, 20), 100) * 1e3, "ms"))
+    return results
+
+def bench_undo(ledger):
+    """Delete, undo and redo on a full ledger, each one is a few Fenwick updates whatever the ledger size"""
+    sample = random.Random(7).sample(range(len(ledger)), min(len(ledger), 100))
+
+    def edit_cycle(): # every row ends up live again
+        for row in sample:
+            ledger.delete(row)
+            ledger.undo()
+            ledger.redo()
+            ledger.undo()
+    return [("undo_redo", timed(edit_cycle) / (4 * len(sample)) * 1e6, "us")]
+
+def bench_ingest():
+    """Single-transaction posts per second through the local HTTP service, clients and server share this process"""
+    import asyncio
+    import threading
+    from budgetbuddy_server import Ingest_Service
+    ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES)
+    service = Ingest_Service(ledger.store, port=0)
+    service.start()
+    running = [True]
+
+    def owner(): # stands in for the window's drain timer
+        while running[0]:
+            service.drain(ledger, timeout=0.01)
+    owner_thread = threading.Thread(target=owner)
+    owner_thread.start()
+
+    body = json.dumps({"type": "Expense", "category": "Food", "amount": "12.50"}).encode()
+    request = b"POST /transactions HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+
+    async def client():
+        reader, writer = await asyncio.open_connection(service.host, service.port)
+        for _ in range(INGEST_POSTS):
+            writer.write(request)
+            await writer.drain()
+            length = 0
+            while (line := await reader.readline()) != b"\r\n":
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+        writer.close()
+
+    async def clients():
+        await asyncio.gather(*(client() for _ in range(INGEST_CLIENTS)))
+    elapsed = timed(lambda: asyncio.run(clients()))
+    running[0] = False
+    owner_thread.join()
+    service.stop()
+    return [("ingest_posts", INGEST_CLIENTS * INGEST_POSTS / elapsed, "posts/s")]
+
+def bench_history(ledger):
+    """Open the history list and scroll through it, needs a display"""
+    import tkinter as tk
+    from budgetbuddy_history import Virtual_List
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        return [("history_render", None, f"skipped: {error}")]
+    store = ledger.store
+
+    def open_list():
+        history_list = Virtual_List(root, lambda: len(store), lambda index: (str(store[index]), "#FFFFFF"))
+        history_list.pack()
+        root.update()
+        return history_list
+    elapsed_open = timed(lambda: open_list().destroy(), 5)
+    history_list = open_list()
+    elapsed_scroll = timed(lambda: (history_list.scroll_to(random.randrange(len(store))), root.update_idletasks()), 100)
+    root.destroy()
+    return [("history_open", elapsed_open * 1e3, "ms"), ("history_scroll", elapsed_scroll * 1e3, "ms")]
+
+def run_suite(sizes, memory_sizes):
+    """Run every benchmark at every size, returns a list of result dicts"""
+    results = []
+    for rows in sizes:
+        print(f"{rows} rows...", file=sys.stderr)
+        columns = synthetic_columns(rows)
+        ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES) # in memory, the file layer has its own costs
+        measured = bench_submit(rows) + bench_batch_submit(rows) + bench_bulk_insert(rows, ledger, columns) + bench_queries(ledger) + bench_undo(ledger) + bench_history(ledger)
+        if rows in memory_sizes:
+            measured += bench_memory(rows)
+        results += [{"benchmark": name, "rows": rows, "value": value, "unit": unit} for name, value, unit in measured]
+    results += [{"benchmark": name, "rows": INGEST_CLIENTS * INGEST_POSTS, "value": value, "unit": unit} for name, value, unit in bench_ingest()]
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Budget Buddy benchmark suite")
+    parser.add_argument("--sizes", default="10000,1000000,10000000", help="comma separated ledger sizes")
+    parser.add_argument("--memory-sizes", default="1000000,10000000", help="sizes that also run the (slow) memory comparison")
+    parser.add_argument("--json", help="write results to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "results": run_suite([int(rows) for rows in args.sizes.split(",")], {int(rows) for rows in args.memory_sizes.split(",") if rows}),
+    }
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
@@ -0,0 +1,164 @@
+"""Combined category totals over a directory of ledgers, run with: python budgetbuddy_consolidate.py DIRECTORY [--workers N] [--json]"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress
+from operator import and_
+from budgetbuddy_ledger import Ledger_Store, INCOME_CATEGORIES, EXPENSE_CATEGORIES
+from budgetbuddy_storage import Ledger_File, Event_Log
+from budgetbuddy_undo import event_changes, event_rows_valid
+
+CACHE_FILE = ".budgetbuddy_consolidate.json" # kept in the scanned directory
+CACHE_VERSION = 1
+
+def ledger_paths(directory):
+    """Every *.ledger file directly in 'directory', sorted by name"""
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.endswith(".ledger") and os.path.isfile(os.path.join(directory, name)))
+
+def summarize_ledger(path):
+    """Live rows and cents per category for one ledger file, runs in a worker process"""
+    store = Ledger_Store(INCOME_CATEGORIES, EXPENSE_CATEGORIES)
+    Ledger_File(path).load(store, read_only=True)
+    state_records, events = Event_Log(path + ".events").load(read_only=True)
+    for record in state_records:
+        if record[2] < len(store):
+            store.set_live(record[2], False)
+    for event in events:
+        if not event_rows_valid(event, len(store)):
+            break # rest refers to rows the ledger file never got, the app drops them on its next start
+        for row, alive in event_changes(event):
+            store.set_live(row, alive)
+
+    categories = store.categories.tobytes()
+    totals = {}
+    for category_code in set(categories): # C-level pass per category, no per-row Python
+        selector = categories.translate(bytes(code == category_code for code in range(256)))
+        totals[store.category_names[category_code]] = sum(compress(store.cents, map(and_, selector, store.live) if store.dead else selector))
+    return {"rows": len(store) - store.dead, "categories": totals}
+
+def run_summary(path):
+    """(summary, None) or (None, error message), so one bad file does not stop the pool"""
+    try:
+        return summarize_ledger(path), None
+    except (OSError, ValueError, struct.error) as error: # struct.error in case a damaged file gets past the header checks
+        return None, str(error) or type(error).__name__
+
+def file_key(path):
+    """Size and mtime in ns of the ledger and its event log, a summary is reused while they all match"""
+    key = []
+    for file_path in (path, path + ".events"):
+        try:
+            status = os.stat(file_path)
+        except FileNotFoundError:
+            key += [None, None] # no edits or deletes yet
+        else:
+            key += [status.st_size, status.st_mtime_ns]
+    return key
+
+def load_cache(cache_path):
+    """File name -> {"key", "summary"} from an earlier run, empty if missing or unreadable"""
+    try:
+        with open(cache_path) as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache.get("files", {})
+
+def save_cache(cache_path, files):
+    """Write the cache atomically, a crash leaves the old one in place, a directory we cannot write to just goes without"""
+    temporary = cache_path + ".tmp"
+    try:
+        with open(temporary, "w") as cache_file:
+            json.dump({"version": CACHE_VERSION, "files": files}, cache_file)
+        os.replace(temporary, cache_path)
+    except OSError as error:
+        print(f"Not caching summaries: {error}", file=sys.stderr)
+
+def merge(summaries):
+    """Add per-ledger summaries into one, every known category is present"""
+    combined = {"ledgers": 0, "rows": 0, "categories": dict.fromkeys(INCOME_CATEGORIES + EXPENSE_CATEGORIES, 0)}
+    for summary in summaries:
+        combined["ledgers"] += 1
+        combined["rows"] += summary["rows"]
+        for category, cents in summary["categories"].items():
+            combined["categories"][category] += cents
+    combined["income"] = sum(combined["categories"][category] for category in INCOME_CATEGORIES)
+    combined["expense"] = sum(combined["categories"][category] for category in EXPENSE_CATEGORIES)
+    combined["net"] = combined["income"] - combined["expense"]
+    return combined
+
+def consolidate(directory, workers=None, use_cache=True):
+    """Combined summary of every ledger in 'directory', returns (summary, files reprocessed, errors)
+
+    Only files whose size or mtime changed since the last run are read again, in
+    parallel over a process pool. Unreadable files are reported and left out.
+    """
+    cache_path = os.path.join(directory, CACHE_FILE)
+    cached = load_cache(cache_path) if use_cache else {}
+    files = {} # file name -> {"key", "summary"}, becomes the new cache
+    stale = []
+    for path in ledger_paths(directory):
+        name = os.path.basename(path)
+        key = file_key(path)
+        if name in cached and cached[name]["key"] == key:
+            files[name] = cached[name]
+        else:
+            stale.append((name, path, key))
+
+    errors = []
+    paths = [path for _, path, _ in stale]
+    if len(paths) < 2 or workers == 1:
+        results = list(map(run_summary, paths)) # not worth starting a pool
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_summary, paths, chunksize=max(1, len(paths) // (4 * workers))))
+    for (name, _, key), (summary, error) in zip(stale, results):
+        if error:
+            errors.append((name, error))
+        else:
+            files[name] = {"key": key, "summary": summary}
+
+    if use_cache:
+        save_cache(cache_path, files)
+    return merge(entry["summary"] for entry in files.values()), len(stale), errors
+
+def report(summary):
+    """Plain-text table of the combined totals"""
+    lines = [f"{summary['ledgers']} ledgers, {summary['rows']:,} transactions", ""]
+    for heading, categories in (("Income", INCOME_CATEGORIES), ("Expenses", EXPENSE_CATEGORIES)):
+        lines.append(heading)
+        for category in categories:
+            lines.append(f"  {category:<16}{summary['categories'][category] / 100:>18,.2f}")
+    lines.append("")
+    for label, key in (("Total income", "income"), ("Total expenses", "expense"), ("Net", "net")):
+        lines.append(f"{label:<18}{summary[key] / 100:>18,.2f}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    """Parse options, consolidate and print a table or JSON"""
+    parser = argparse.ArgumentParser(description="Combined category totals over a directory of Budget Buddy ledgers")
+    parser.add_argument("directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to one per core")
+    parser.add_argument("--json", action="store_true", help="print the totals as JSON, amounts in cents")
+    parser.add_argument("--no-cache", action="store_true", help="read every ledger and leave the cache alone")
+    args = parser.parse_args(argv)
+
+    summary, reprocessed, errors = consolidate(args.directory, args.workers, not args.no_cache)
+    for name, error in errors:
+        print(f"Skipping {name}: {error}", file=sys.stderr)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(report(summary))
+        print(f"\n{reprocessed} of {summary['ledgers'] + len(errors)} ledgers read, the rest came from the cache")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""Budget Buddy without the window: validation, storage and totals in one place"""
+
+from array import array
+from itertools import repeat
+from operator import mul
+from budgetbuddy_ledger import Ledger_Store, DAY_LIMIT, check_day, today
+from budgetbuddy_storage import Ledger_File, Event_Log
+from budgetbuddy_aggregates import Aggregates, DEFERRED_ROWS
+from budgetbuddy_search import Search_Index
+from budgetbuddy_undo import ADD, DELETE, EDIT, DEAD, Undo_History, event_changes, event_rows_valid
+
+CHECKPOINT_ROWS = 50000 # save the aggregate checkpoint once this many rows are not covered by it
+CHECKPOINT_EVENTS = 1000 # same for events, the checkpoint also compacts the event log so this bounds its size
+BUILD_ROWS = 20000 # rows per build_step(), a few tens of milliseconds at most
+
+class Budget_Ledger:
+    """Headless budgeting core, Budget_Buddy is a view on top of this"""
+    def __init__(self, income_categories, expense_categories, path=None):
+        """Load the ledger file at 'path', or keep everything in memory if path is None"""
+        self.store = Ledger_Store(income_categories, expense_categories)
+        self.aggregates = Aggregates(self.store)
+        self.search_index = Search_Index(self.store) # kept up to date once build_step() has caught it up
+        self.listeners = [] # callables(start, stop) told about every batch of new rows
+        self.change_listeners = [] # callables(rows) told about rows deleted or brought back by an edit, delete, undo or redo
+        self.history = Undo_History()
+        self.events = 0 # events applied so far, compacted ones included
+        self.ledger_file = None
+        self.event_log = None
+        self.checkpoint_path = None
+        if path:
+            self.ledger_file = Ledger_File(path)
+            self.ledger_file.load(self.store)
+            self.event_log = Event_Log(path + ".events")
+            self.checkpoint_path = path + ".agg"
+            self.replay(*self.event_log.load()) # totals come from the checkpoint plus whatever was saved after it
+        self.checkpoint_rows = self.aggregates.rows
+        self.checkpoint_events = self.events
+        self.aggregates.catch_up()
+
+    def replay(self, state_records, events):
+        """Rebuild dead rows, totals and undo stacks from the checkpoint and the event log
+
+        The checkpoint holds the totals and the stacks as of some event, events
+        before it only mark rows dead, so startup work is the compacted state
+        plus the short tail of events logged since the last checkpoint.
+        """
+        store = self.store
+        valid = 0
+        while valid < len(events) and event_rows_valid(events[valid], len(store)):
+            valid += 1
+        if valid < len(events):
+            print(f"Event log {self.event_log.path}: dropping {len(events) - valid} events for transactions that were never saved")
+            self.event_log.truncate(valid)
+            del events[valid:]
+        for _, _, row, _ in state_records:
+            if row < len(store):
+                store.set_live(row, False)
+
+        base = self.event_log.base
+        extra = self.aggregates.load(self.checkpoint_path)
+        covered = None if extra is None else extra.get("events", 0) # events the checkpoint's totals include
+        if covered is None or not base <= covered <= base + len(events):
+            self.aggregates = Aggregates(store) # missing or out of step, rebuild the totals from the rows
+            covered = base # and keep whatever undo history the log still has
+        else:
+            self.history = Undo_History(extra.get("undo", ()), extra.get("redo", ()))
+        for number, event in enumerate(events, base):
+            if number < covered:
+                for row, alive in event_changes(event):
+                    store.set_live(row, alive)
+            else:
+                self.history.record(event)
+                self.apply_changes(event)
+        self.events = base + len(events)
+
+    def __len__(self):
+        """Number of transactions"""
+        return len(self.store)
+
+    def submit(self, transaction_type, category, amount, day=None):
+        """Add one transaction, raises ValueError with a user-facing message if it breaks the rules"""
+        self.store.validate(transaction_type, category, amount)
+        if day is not None:
+            check_day(day)
+        self.store.append(transaction_type, category, amount, day)
+        self.rows_added(len(self.store) - 1)
+
+    def edit(self, row, transaction_type, category, amount, day=None):
+        """Replace a transaction with corrected values, dated like the old one unless 'day' is given, returns the new row number
+
+        Raises ValueError like submit(), or if the transaction was already deleted.
+        """
+        self.check_live(row)
+        self.store.validate(transaction_type, category, amount)
+        day = self.store.days[row] if day is None else check_day(day)
+        self.store.append(transaction_type, category, amount, day)
+        new_row = len(self.store) - 1
+        self.rows_added(new_row, log=False) # the edit event covers the new row
+        self.log_event((EDIT, 0, row, new_row))
+        return new_row
+
+    def delete(self, row):
+        """Delete a transaction, raises ValueError if it was already deleted"""
+        self.check_live(row)
+        self.log_event((DELETE, 0, row, 0))
+
+    def undo(self):
+        """Reverse the newest add, edit or delete, returns the undo event or None if there is nothing to undo"""
+        event = self.history.undo_event()
+        if event:
+            self.log_event(event)
+        return event
+
+    def redo(self):
+        """Apply the newest undone action again, returns the redo event or None if there is nothing to redo"""
+        event = self.history.redo_event()
+        if event:
+            self.log_event(event)
+        return event
+
+    def check_live(self, row):
+        """Raise ValueError unless 'row' is a live transaction"""
+        if not 0 <= row < len(self.store) or not self.store.live[row]:
+            raise ValueError("That transaction was already deleted.")
+
+    def submit_many(self, transactions):
+        """Add (type, category, amount) or (type, category, amount, day) rows, returns rejected (index, reason) pairs"""
+        start = len(self.store)
+        rejected = []
+        try:
+            for index, transaction in enumerate(transactions):
+                day = transaction[3] if len(transaction) > 3 else None
+                try:
+                    self.store.validate(*transaction[:3])
+                    if day is not None:
+                        check_day(day)
+                except ValueError as error:
+                    rejected.append((index, str(error)))
+                    continue
+                self.store.append(*transaction)
+        finally:
+            if len(self.store) > start: # whatever made it into the store also goes to the file and the totals
+                self.rows_added(start)
+        return rejected
+
+    def submit_batch(self, types, categories, amounts, days=None):
+        """Add columns of transactions in one step, validated with whole-column passes, returns rejected (index, reason) pairs
+
+        Clean batches never run Python code per row: codes come from map() over the
+        interning tables, the type check is one bytes.translate() and cents are one
+        map() chain. A batch with any bad row goes through submit_many() instead so
+        every rejected row gets its own reason.
+        """
+        store = self.store
+        count = len(amounts)
+        if days is None:
+            days = array("I", [today()]) * count
+        try:
+            type_codes = array("B", bytes(map(store.type_codes.__getitem__, types))) # bytes() builds faster, array() then copies it in one go
+            category_codes = array("B", bytes(map(store.category_codes.__getitem__, categories)))
+            floats = list(map(float, amounts)) # float() hands back float inputs as they are, so this is nearly free for them
+            cents = array("q", map(round, map(mul, floats, repeat(100)))) # round() refuses nan and inf
+            day_column = days if isinstance(days, array) and days.typecode == "I" else array("I", days)
+        except (KeyError, TypeError, ValueError, OverflowError):
+            return self.submit_many(zip(types, categories, amounts, days))
+        category_type_table = bytes(store.category_types) + bytes(256 - len(store.category_types)) # category code -> type code
+        if (len(type_codes) != count or len(category_codes) != count or len(day_column) != count
+                or category_codes.tobytes().translate(category_type_table) != type_codes.tobytes()
+                or count and min(floats) < 0 # on the floats, -0.001 rounds to 0 cents but is still negative
+                or count and max(day_column) >= DAY_LIMIT): # the array only guarantees 32 bits
+            return self.submit_many(zip(types, categories, amounts, days))
+        self.extend(type_codes, category_codes, cents, day_column)
+        return []
+
+    def extend(self, types, categories, cents, days, undoable=True):
+        """Add rows that are already validated and encoded, like the importer's batches, as one undo step unless not undoable"""
+        start = len(self.store)
+        self.store.extend(types, categories, cents, days)
+        self.rows_added(start, log=undoable)
+
+    def subscribe(self, listener):
+        """Call listener(start, stop) whenever rows [start, stop) are added"""
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """Stop calling a listener added with subscribe()"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def subscribe_changes(self, listener):
+        """Call listener(rows) whenever existing rows are deleted or brought back"""
+        self.change_listeners.append(listener)
+
+    def unsubscribe_changes(self, listener):
+        """Stop calling a listener added with subscribe_changes()"""
+        if listener in self.change_listeners:
+            self.change_listeners.remove(listener)
+
+    def rows_added(self, start, log=True):
+        """Write store rows from 'start' on to the file, fold them into the totals, log the add and tell the listeners"""
+        stop = len(self.store)
+        if start == stop:
+            return # an empty batch is not an undo step and listeners never see an empty range
+        if self.ledger_file:
+            self.ledger_file.write_rows(self.store, start, stop)
+        self.aggregates.catch_up()
+        if self.search_index.rows == start and stop - start <= DEFERRED_ROWS: # a lagging index or a huge batch waits for build_step()
+            self.search_index.catch_up()
+        if log:
+            self.log_event((ADD, 0, start, stop)) # one undo step per submit, batch or import batch
+        for listener in list(self.listeners): # a listener may unsubscribe while being called
+            listener(start, stop)
+
+    def log_event(self, event):
+        """Write an event to the log, apply it and tell the change listeners"""
+        if self.event_log:
+            self.event_log.append(event)
+        self.events += 1
+        self.history.record(event)
+        changed = self.apply_changes(event)
+        if changed:
+            for listener in list(self.change_listeners):
+                listener(changed)
+
+    def apply_changes(self, event):
+        """Mark the rows an event names live or dead and fix the totals for them, returns the rows that changed"""
+        changed = []
+        for row, alive in event_changes(event):
+            if self.store.set_live(row, alive):
+                changed.append(row)
+                self.aggregates.add_row(row, 1 if alive else -1)
+        return changed
+
+    def build_step(self, limit=BUILD_ROWS):
+        """Do up to 'limit' rows of deferred work, returns True once there is none left
+
+        Opening a large ledger without a checkpoint only sums the type totals and
+        the search index starts out empty, the window calls this from a timer so
+        both fill in between events instead of on the first report or search.
+        """
+        if not self.aggregates.build_trees(limit):
+            return False
+        return self.search_index.catch_up(limit)
+
+    def search(self, transaction_type=None, category=None, min_amount=None, max_amount=None, text=""):
+        """Row numbers of matching transactions, see Search_Index.search"""
+        return self.search_index.search(transaction_type, category, min_amount, max_amount, text)
+
+    def total(self):
+        """Income minus expenses in dollars"""
+        return self.aggregates.total_cents() / 100
+
+    def commit(self):
+        """Fsync pending writes, and checkpoint the totals if enough rows piled up since the last one"""
+        if self.ledger_file:
+            self.ledger_file.commit()
+            self.event_log.commit() # after the rows its events refer to
+            if (self.aggregates.rows - self.checkpoint_rows >= CHECKPOINT_ROWS
+                    or self.events - self.checkpoint_events >= CHECKPOINT_EVENTS) and self.aggregates.build_trees(0):
+                self.save_checkpoint() # not while build_step() is still filling in the trees, close() checkpoints anyway
+
+    def save_checkpoint(self):
+        """Save the aggregates and undo stacks, then compact the event log down to the dead rows
+
+        Only runs after the rows and events it covers are committed, a crash
+        between the checkpoint and the compaction leaves a log the checkpoint
+        still matches.
+        """
+        if self.ledger_file:
+            self.ledger_file.commit()
+            self.event_log.commit()
+            extra = {"events": self.events}
+            extra.update(self.history.snapshot())
+            self.aggregates.save(self.checkpoint_path, extra)
+            if self.events > self.event_log.base:
+                self.event_log.compact(self.events, [(DEAD, 0, row, 0) for row in self.store.dead_rows()])
+            self.checkpoint_rows = self.aggregates.rows
+            self.checkpoint_events = self.events
+
+    def close(self):
+        """Commit everything and close the file"""
+        if self.ledger_file:
+            self.save_checkpoint()
+            self.ledger_file.close()
+            self.event_log.close()
@@ -0,0 +1,117 @@
+"""Optional instrumentation: handler timings, widgets created per call and Tk event-loop lag"""
+
+import json
+import time
+import tkinter as tk
+from collections import deque
+
+MAX_EVENTS = 100000 # trace events kept in memory, oldest dropped first
+LAG_PROBE_MS = 100 # how often the event-loop probe is scheduled
+PANEL_REFRESH_MS = 500
+
+def count_widgets(widget):
+    """Widgets in the tree under 'widget', itself included"""
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+class Instrumentation:
+    """Wraps handlers on an instance with timing code, when this is never created nothing is wrapped and nothing is paid"""
+    def __init__(self, root):
+        """Empty stats, call instrument() before the handlers are bound to buttons"""
+        self.root = root
+        self.started = time.perf_counter()
+        self.events = deque(maxlen=MAX_EVENTS) # Chrome trace events
+        self.handler_stats = {} # handler name -> [calls, total seconds, max seconds, widgets created by last call]
+        self.lag_samples = deque(maxlen=600) # last minute of event-loop lag, seconds
+        self.probe_due = None
+
+    def instrument(self, target, names):
+        """Replace each named method on 'target' with a timed wrapper"""
+        for name in names:
+            setattr(target, name, self.timed(name, getattr(target, name)))
+
+    def timed(self, name, function):
+        """Wrapper that records duration and widgets created for every call of function"""
+        def timed_call(*args, **kwargs):
+            widgets_before = count_widgets(self.root)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                created = count_widgets(self.root) - widgets_before
+                stats = self.handler_stats.setdefault(name, [0, 0.0, 0.0, 0])
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+                stats[3] = created
+                self.events.append({"name": name, "ph": "X", "pid": 1, "tid": 1,
+                                    "ts": (start - self.started) * 1e6, "dur": elapsed * 1e6,
+                                    "args": {"widgets_created": created}})
+        return timed_call
+
+    def start_lag_probe(self):
+        """Schedule the periodic probe, lag is how late each after() callback fires"""
+        self.probe_due = time.perf_counter() + LAG_PROBE_MS / 1000
+        self.root.after(LAG_PROBE_MS, self.lag_probe)
+
+    def lag_probe(self):
+        """Record how late this callback ran, then schedule the next one"""
+        now = time.perf_counter()
+        lag = max(0.0, now - self.probe_due)
+        self.lag_samples.append(lag)
+        self.events.append({"name": "event loop lag", "ph": "C", "pid": 1, "tid": 1,
+                            "ts": (now - self.started) * 1e6, "args": {"lag_ms": lag * 1000}})
+        self.probe_due = now + LAG_PROBE_MS / 1000
+        self.root.after(LAG_PROBE_MS, self.lag_probe)
+
+    def summary(self):
+        """Plain-text stats for the panel"""
+        lines = [f"{'handler':<24}{'calls':>7}{'avg ms':>9}{'max ms':>9}{'widgets':>9}"]
+        for name, (calls, total, longest, created) in sorted(self.handler_stats.items()):
+            lines.append(f"{name:<24}{calls:>7}{total / calls * 1000:>9.2f}{longest * 1000:>9.2f}{created:>9}")
+        if self.lag_samples:
+            samples = sorted(self.lag_samples)
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            lines.append(f"event loop lag: avg {sum(samples) / len(samples) * 1000:.1f} ms, "
+                         f"p95 {p95 * 1000:.1f} ms, max {samples[-1] * 1000:.1f} ms")
+        lines.append(f"widgets alive: {count_widgets(self.root)}")
+        return "\n".join(lines)
+
+    def export(self, path):
+        """Write a Chrome trace (chrome://tracing, Perfetto) with the raw events and a stats summary"""
+        with open(path, "w") as trace:
+            json.dump({"traceEvents": list(self.events), "displayTimeUnit": "ms",
+                       "otherData": {"handlers": self.handler_stats}}, trace)
+
+class Diagnostics_Panel(tk.Toplevel):
+    """Small window showing the instrumentation stats, with an export button"""
+    def __init__(self, master, instrumentation, **kwargs):
+        """Setup stats label and export button"""
+        super().__init__(master, **kwargs)
+        self.title("Diagnostics")
+        self.instrumentation = instrumentation
+        self.refresh_job = None # pending after() id
+        self.stats_label = tk.Label(self, justify="left", anchor="w", font=("Courier", 9))
+        self.stats_label.pack(fill="both", padx=10, pady=5)
+        self.export_button = tk.Button(self, text="Export Trace", command=self.export)
+        self.export_button.pack(pady=5)
+        self.refresh()
+        self.bind("<Destroy>", self.on_destroy)
+
+    def refresh(self):
+        """Update the stats text, reschedules itself while the panel is open"""
+        self.stats_label.config(text=self.instrumentation.summary())
+        self.refresh_job = self.after(PANEL_REFRESH_MS, self.refresh)
+
+    def on_destroy(self, event):
+        """Stop refreshing once the panel is closed"""
+        if event.widget is self and self.refresh_job:
+            self.after_cancel(self.refresh_job)
+
+    def export(self):
+        """Handler for 'Export Trace'"""
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(parent=self, title="Export Trace", defaultextension=".json",
+                                            filetypes=[("Chrome trace / JSON", "*.json")])
+        if path:
+            self.instrumentation.export(path)
@@ -0,0 +1,293 @@
+"""Scrollable transaction history that only draws the rows on screen"""
+
+import bisect
+import tkinter as tk
+from array import array
+from tkinter import ttk
+from budgetbuddy_ledger import CENTS_LIMIT
+
+class Virtual_List(tk.Frame):
+    """Canvas backed list, keeps a small pool of row items and re-labels them as you scroll"""
+    ROW_HEIGHT = 24 # pixels per row, includes the 2px gap above and below like the old labels
+
+    def __init__(self, master, row_count, row_source, on_select=None, width=360, height=480, **kwargs):
+        """Setup canvas, scrollbar and scroll bindings"""
+        super().__init__(master, **kwargs)
+        self.row_count = row_count # callable, returns number of rows
+        self.row_source = row_source # callable(index), returns (text, background color)
+        self.on_select = on_select # callable(index) for a clicked row, or None
+        self.first = 0 # index of the row at the top of the canvas
+        self.selected = None # index of the outlined row
+        self.rows = [] # pool of (rectangle, text) canvas items, one per visible slot
+
+        self.canvas = tk.Canvas(self, width=width, height=height, highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.canvas.pack(side=tk.LEFT, fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", self.on_resize) # pool size follows window height
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel) # Windows and macOS
+        self.canvas.bind("<Button-4>", self.on_mousewheel) # Linux scroll up
+        self.canvas.bind("<Button-5>", self.on_mousewheel) # Linux scroll down
+        self.canvas.bind("<Button-1>", self.on_click)
+
+    def visible_count(self):
+        """Number of whole rows that fit in the canvas"""
+        return max(1, self.canvas.winfo_height() // self.ROW_HEIGHT)
+
+    def on_resize(self, event):
+        """Grow the item pool to cover the new height and stretch rows to the new width"""
+        needed = event.height // self.ROW_HEIGHT + 1 # +1 for the partly visible bottom row
+        while len(self.rows) < needed:
+            top = len(self.rows) * self.ROW_HEIGHT
+            rectangle = self.canvas.create_rectangle(5, top + 2, event.width - 5, top + self.ROW_HEIGHT - 2, width=0)
+            text = self.canvas.create_text(10, top + self.ROW_HEIGHT // 2, anchor="w")
+            self.rows.append((rectangle, text))
+        for slot, (rectangle, text) in enumerate(self.rows):
+            top = slot * self.ROW_HEIGHT
+            self.canvas.coords(rectangle, 5, top + 2, event.width - 5, top + self.ROW_HEIGHT - 2)
+        self.scroll_to(self.first) # clamp in case the window got taller
+
+    def scroll_to(self, first):
+        """Move the top of the view to row 'first' and redraw"""
+        last_first = max(0, self.row_count() - self.visible_count())
+        self.first = min(max(0, int(first)), last_first)
+        self.refresh()
+
+    def on_scroll(self, action, amount, unit=None):
+        """Scrollbar handler, called with ('moveto', fraction) or ('scroll', n, 'units'/'pages')"""
+        if action == "moveto":
+            self.scroll_to(float(amount) * self.row_count())
+        elif action == "scroll":
+            step = self.visible_count() if unit == "pages" else 1
+            self.scroll_to(self.first + int(amount) * step)
+
+    def on_mousewheel(self, event):
+        """Scroll three rows per wheel notch"""
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.first - 3)
+        else:
+            self.scroll_to(self.first + 3)
+
+    def on_click(self, event):
+        """Select the row under the pointer"""
+        index = self.first + event.y // self.ROW_HEIGHT
+        if self.on_select and index < self.row_count():
+            self.selected = index
+            self.refresh()
+            self.on_select(index)
+
+    def refresh(self):
+        """Re-label the pooled items for the rows currently in view"""
+        count = self.row_count()
+        for slot, (rectangle, text) in enumerate(self.rows):
+            index = self.first + slot
+            if index < count:
+                row_text, background_color = self.row_source(index)
+                outline = 2 if index == self.selected else 0
+                self.canvas.itemconfigure(rectangle, fill=background_color, width=outline, outline="black", state="normal")
+                self.canvas.itemconfigure(text, text=row_text, state="normal")
+            else:
+                self.canvas.itemconfigure(rectangle, state="hidden") # past the end of the list
+                self.canvas.itemconfigure(text, state="hidden")
+
+        # Scrollbar takes fractions of the whole list
+        if count:
+            self.scrollbar.set(self.first / count, min(1.0, (self.first + self.visible_count()) / count))
+        else:
+            self.scrollbar.set(0, 1)
+
+class History_Search(tk.Frame):
+    """Search bar over a Virtual_List, filters by type, category, amount range and free text as you type"""
+    SEARCH_DELAY_MS = 200 # wait for typing to pause before searching
+    PATCH_ROWS = 256 # changes bigger than this (undoing a whole import batch) search again instead of patching the list
+
+    def __init__(self, master, ledger, row_source, **kwargs):
+        """Setup filter widgets and the list, starts out showing everything"""
+        super().__init__(master, **kwargs)
+        self.ledger = ledger # Budget_Ledger, answers search()
+        self.row_source = row_source # callable(ledger row), returns (text, background color)
+        self.query = None # compiled filters, None shows every row
+        self.rows = ledger.search() # ledger rows currently shown, all of them until a filter is set
+        self.search_job = None # pending after() id
+
+        # Filter widgets, one labelled column each
+        filter_frame = tk.Frame(self)
+        filter_frame.pack(fill="x", padx=5)
+        store = ledger.store
+        self.type_combobox = ttk.Combobox(filter_frame, state="readonly", width=8, values=["All"] + store.type_names)
+        self.category_combobox = ttk.Combobox(filter_frame, state="readonly", width=13, values=["All"] + store.category_names)
+        self.min_entry = tk.Entry(filter_frame, width=8)
+        self.max_entry = tk.Entry(filter_frame, width=8)
+        self.text_entry = tk.Entry(filter_frame, width=14)
+        widgets = [("Type", self.type_combobox), ("Category", self.category_combobox), ("Min $", self.min_entry), ("Max $", self.max_entry), ("Search", self.text_entry)]
+        for column, (text, widget) in enumerate(widgets):
+            tk.Label(filter_frame, text=text).grid(row=0, column=column, sticky="w")
+            widget.grid(row=1, column=column, padx=2)
+        self.type_combobox.set("All")
+        self.category_combobox.set("All")
+        self.type_combobox.bind("<<ComboboxSelected>>", self.schedule_search)
+        self.category_combobox.bind("<<ComboboxSelected>>", self.schedule_search)
+        for entry in (self.min_entry, self.max_entry, self.text_entry):
+            entry.bind("<KeyRelease>", self.schedule_search)
+
+        self.count_label = tk.Label(self, anchor="w")
+        self.count_label.pack(fill="x", padx=5)
+        self.history_list = Virtual_List(self, lambda: len(self.rows), lambda index: self.row_source(self.rows[index]), self.select)
+        self.history_list.pack(fill="both", expand=True, padx=5, pady=2)
+        self.show_count()
+
+        # Edit bar for the clicked transaction
+        self.selected_row = None # ledger row being edited
+        edit_frame = tk.Frame(self)
+        edit_frame.pack(fill="x", padx=5, pady=5)
+        self.selected_label = tk.Label(edit_frame, text="Click a transaction to edit it", anchor="w")
+        self.selected_label.grid(row=0, column=0, columnspan=5, sticky="w")
+        self.edit_type_combobox = ttk.Combobox(edit_frame, state="readonly", width=8, values=store.type_names)
+        self.edit_category_combobox = ttk.Combobox(edit_frame, state="readonly", width=13)
+        self.edit_amount_entry = tk.Entry(edit_frame, width=10)
+        self.save_button = tk.Button(edit_frame, text="Save Edit", command=self.save_edit, state="disabled")
+        self.delete_button = tk.Button(edit_frame, text="Delete", command=self.delete_selected, state="disabled")
+        for column, widget in enumerate([self.edit_type_combobox, self.edit_category_combobox, self.edit_amount_entry, self.save_button, self.delete_button]):
+            widget.grid(row=1, column=column, padx=2)
+        self.edit_type_combobox.bind("<<ComboboxSelected>>", self.update_edit_categories)
+
+        # Stay live, new transactions show up and deleted ones go away without reopening
+        self.ledger.subscribe(self.rows_added)
+        self.ledger.subscribe_changes(self.rows_changed)
+        self.bind("<Destroy>", self.on_destroy)
+
+    def rows_added(self, start, stop):
+        """Ledger listener, adds matching new rows to the end of the list without searching again"""
+        index = self.ledger.search_index
+        if self.query is None and not self.ledger.store.dead:
+            self.rows = range(stop) # no filter, every row is shown
+        else:
+            if isinstance(self.rows, range):
+                self.rows = array("I", self.rows)
+            self.rows.extend(index.filter_rows(self.query or index.compile(), range(start, stop)))
+        self.history_list.refresh()
+        self.show_count()
+
+    def rows_changed(self, rows):
+        """Ledger change listener, deleted rows drop out and restored ones come back in place without searching again"""
+        index = self.ledger.search_index
+        query = self.query or index.compile()
+        if len(rows) > self.PATCH_ROWS:
+            self.rows = index.run(query)
+        else:
+            if isinstance(self.rows, range):
+                self.rows = array("I", self.rows)
+            for row in rows:
+                position = bisect.bisect_left(self.rows, row) # shown rows are ascending
+                shown = position < len(self.rows) and self.rows[position] == row
+                if index.filter_rows(query, (row,)): # live and matching the filters
+                    if not shown:
+                        self.rows.insert(position, row)
+                elif shown:
+                    del self.rows[position]
+        if self.selected_row in rows:
+            self.clear_selection()
+        self.history_list.selected = self.list_index(self.selected_row)
+        self.history_list.scroll_to(self.history_list.first) # keep the scroll position
+        self.show_count()
+
+    def on_destroy(self, event):
+        """Stop listening once the window is gone"""
+        if event.widget is self:
+            self.ledger.unsubscribe(self.rows_added)
+            self.ledger.unsubscribe_changes(self.rows_changed)
+            if self.search_job:
+                self.after_cancel(self.search_job)
+
+    def list_index(self, row):
+        """Position of a ledger row in the shown list, None if it is not shown"""
+        if row is None:
+            return None
+        position = bisect.bisect_left(self.rows, row) # shown rows are ascending
+        return position if position < len(self.rows) and self.rows[position] == row else None
+
+    def select(self, index):
+        """Virtual_List click handler, loads the transaction into the edit bar"""
+        self.selected_row = self.rows[index]
+        transaction_type, category, amount = self.ledger.store[self.selected_row]
+        self.selected_label.config(text=f"Transaction {self.selected_row + 1}")
+        self.edit_type_combobox.set(transaction_type)
+        self.update_edit_categories()
+        self.edit_category_combobox.set(category)
+        self.edit_amount_entry.delete(0, tk.END)
+        self.edit_amount_entry.insert(0, f"{amount:.2f}")
+        self.save_button.config(state="normal")
+        self.delete_button.config(state="normal")
+
+    def clear_selection(self):
+        """Empty the edit bar"""
+        self.selected_row = None
+        self.history_list.selected = None
+        self.selected_label.config(text="Click a transaction to edit it")
+        self.edit_amount_entry.delete(0, tk.END)
+        self.save_button.config(state="disabled")
+        self.delete_button.config(state="disabled")
+
+    def update_edit_categories(self, event=None):
+        """Categories offered in the edit bar follow its type, like the main window's radio buttons"""
+        store = self.ledger.store
+        type_code = store.type_codes[self.edit_type_combobox.get()]
+        self.edit_category_combobox['values'] = [name for name, category_type in zip(store.category_names, store.category_types) if category_type == type_code]
+        if self.edit_category_combobox.get() not in self.edit_category_combobox['values']:
+            self.edit_category_combobox.set("")
+
+    def save_edit(self):
+        """Handler for 'Save Edit', replaces the selected transaction, same checks and popout as Submit"""
+        try:
+            self.ledger.edit(self.selected_row, self.edit_type_combobox.get(), self.edit_category_combobox.get(), self.edit_amount_entry.get())
+        except ValueError as error:
+            from tkinter import messagebox
+            messagebox.showerror("Error", str(error), parent=self)
+
+    def delete_selected(self):
+        """Handler for 'Delete', undo brings it back"""
+        try:
+            self.ledger.delete(self.selected_row)
+        except ValueError as error:
+            from tkinter import messagebox
+            messagebox.showerror("Error", str(error), parent=self)
+
+    def schedule_search(self, event=None):
+        """Restart the debounce timer, only the last keystroke in a burst runs a search"""
+        if self.search_job:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(self.SEARCH_DELAY_MS, self.run_search)
+
+    def amount_filter(self, entry):
+        """Dollar amount typed in a min/max entry, None if blank or not a number (entry turns pink)"""
+        text = entry.get().strip().lstrip("$")
+        try:
+            amount = float(text) if text else None
+            if amount is not None and not abs(amount) < CENTS_LIMIT / 100: # nan, inf and 1e400 parse fine but have no cents value
+                raise ValueError(text)
+            entry.config(background="white")
+        except ValueError:
+            amount = None
+            entry.config(background="#FFD2D2") # light pink, ignored until fixed
+        return amount
+
+    def run_search(self):
+        """Query the ledger indexes with the current filters and redraw from the top"""
+        self.search_job = None
+        transaction_type = self.type_combobox.get()
+        category = self.category_combobox.get()
+        index = self.ledger.search_index
+        query = index.compile(None if transaction_type == "All" else transaction_type,
+                              None if category == "All" else category,
+                              self.amount_filter(self.min_entry), self.amount_filter(self.max_entry),
+                              self.text_entry.get())
+        self.query = None if index.is_open(query) else query
+        self.rows = index.run(query)
+        self.history_list.selected = self.list_index(self.selected_row)
+        self.history_list.scroll_to(0)
+        self.show_count()
+
+    def show_count(self):
+        """Number of matching transactions above the list"""
+        self.count_label.config(text=f"{len(self.rows)} transactions")
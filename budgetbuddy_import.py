@@ -0,0 +1,223 @@
+"""Bulk import of bank CSV and OFX exports, parsed on a worker thread"""
+
+import csv
+import os
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk
+from array import array
+from datetime import date, datetime
+from budgetbuddy_ledger import EPOCH_ORDINAL, DAY_LIMIT, today
+
+BATCH_ROWS = 5000 # rows per batch handed to the UI, one label refresh each
+POLL_MS = 50 # how often the UI checks for finished batches
+CHUNK_SIZE = 1 << 16 # characters read from an OFX file at a time
+
+def parse_day(text):
+    """Bank date (2024-09-24, 09/24/2024 or OFX 20240924...) to a day number, blank means today"""
+    text = text.strip()
+    if not text:
+        return today()
+    if len(text) >= 8 and text[:8].isdigit(): # OFX, time and timezone may follow the date
+        parsed = date(int(text[:4]), int(text[4:6]), int(text[6:8]))
+    else:
+        try:
+            parsed = date.fromisoformat(text)
+        except ValueError:
+            try:
+                parsed = datetime.strptime(text, "%m/%d/%Y").date()
+            except ValueError:
+                raise ValueError(f"Unrecognized date '{text}'.")
+    if parsed.toordinal() < EPOCH_ORDINAL:
+        raise ValueError("Dates before 1970 are not supported.")
+    if parsed.toordinal() - EPOCH_ORDINAL >= DAY_LIMIT:
+        raise ValueError("Dates after 2100 are not supported.")
+    return parsed.toordinal() - EPOCH_ORDINAL
+
+def clean_amount(text):
+    """Strip the $ and thousands separators bank exports like to add"""
+    return text.strip().replace("$", "").replace(",", "")
+
+def signed_entry(amount):
+    """Exports without a type column use the sign, negative is an Expense"""
+    if amount.startswith("-"):
+        return "Expense", amount[1:]
+    return "Income", amount.lstrip("+")
+
+def counted_lines(file, progress):
+    """Yield lines while adding their length to progress[0], csv.reader hides the file position"""
+    for line in file:
+        progress[0] += len(line)
+        yield line
+
+def read_csv(path, progress):
+    """Yield (line, type, category, amount, date) from a CSV with Date, Type (optional), Category and Amount columns"""
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        reader = csv.reader(counted_lines(file, progress))
+        header = [name.strip().lower() for name in next(reader, [])]
+        if "category" not in header or "amount" not in header:
+            raise ValueError("CSV needs at least Category and Amount columns")
+        category_column = header.index("category")
+        amount_column = header.index("amount")
+        type_column = header.index("type") if "type" in header else None
+        date_column = header.index("date") if "date" in header else None
+
+        for row in reader:
+            if not row:
+                continue # blank line
+            if len(row) < len(header):
+                row += [""] * (len(header) - len(row)) # short rows fail validation instead of crashing
+            amount = clean_amount(row[amount_column])
+            if type_column is None:
+                transaction_type, amount = signed_entry(amount)
+            else:
+                transaction_type = row[type_column].strip().title()
+            day_text = row[date_column] if date_column is not None else ""
+            yield reader.line_num, transaction_type, row[category_column].strip(), amount, day_text
+
+def read_ofx(path, progress):
+    """Yield (line, type, category, amount, date) for each <STMTTRN>, category comes from MEMO, or NAME if there is no memo"""
+    fields = None
+    number = 0
+    pending = ""
+    with open(path, encoding="utf-8", errors="replace") as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            progress[0] += len(chunk)
+            pending += chunk
+            tags = pending.split("<")
+            if chunk:
+                pending = tags.pop() # last piece may be cut in half, keep it for the next chunk
+            for tag in tags:
+                name, _, value = tag.partition(">")
+                name = name.strip().upper()
+                if name == "STMTTRN":
+                    fields = {}
+                elif name == "/STMTTRN" and fields is not None:
+                    number += 1
+                    transaction_type, amount = signed_entry(clean_amount(fields.get("TRNAMT", "")))
+                    category = fields.get("MEMO") or fields.get("NAME", "")
+                    yield number, transaction_type, category, amount, fields.get("DTPOSTED", "")
+                    fields = None
+                elif fields is not None and not name.startswith("/"):
+                    fields[name] = value.strip() # SGML style OFX has no closing tags, value runs to the next '<'
+            if not chunk:
+                break
+
+class Import_Job:
+    """Parses and validates a bank export on a worker thread, finished batches wait in a queue for the UI"""
+    def __init__(self, store, path):
+        """Nothing runs until start()"""
+        self.store = store # only the category tables are read from the worker
+        self.path = path
+        self.size = max(1, os.path.getsize(path))
+        self.progress = [0] # characters read so far, written by the worker
+        self.batches = queue.Queue()
+        self.rejected = [] # (line, reason) for the rejected-row report
+        self.cancelled = False # set by the window, the worker stops at the next row
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        """Start parsing in the background"""
+        self.thread.start()
+
+    def run(self):
+        """Worker thread, queues ('batch', columns, rejected) tuples then always ('done', error)"""
+        reader = read_ofx if self.path.lower().endswith((".ofx", ".qfx")) else read_csv
+        columns = self.new_columns()
+        rejected = []
+        error = "Import stopped unexpectedly." # replaced once the file is read or the failure is one we expect
+        try:
+            for line, transaction_type, category, amount, day_text in reader(self.path, self.progress):
+                if self.cancelled:
+                    break
+                try:
+                    cents = self.store.validate(transaction_type, category, amount) # same rules as Submit
+                    day = parse_day(day_text)
+                except ValueError as reason:
+                    rejected.append((line, str(reason)))
+                    continue
+                columns[0].append(self.store.type_codes[transaction_type])
+                columns[1].append(self.store.category_codes[category])
+                columns[2].append(cents)
+                columns[3].append(day)
+                if len(columns[2]) >= BATCH_ROWS:
+                    self.batches.put(("batch", columns, rejected))
+                    columns = self.new_columns()
+                    rejected = []
+            error = "Import cancelled." if self.cancelled else None
+        except (OSError, ValueError, OverflowError, csv.Error) as failure:
+            error = str(failure)
+        finally:
+            self.batches.put(("batch", columns, rejected)) # keep what was good before the failure
+            self.batches.put(("done", error)) # the window waits for this, so it goes out whatever happened
+
+    def new_columns(self):
+        """Empty (types, categories, cents, days) arrays in the store's layout"""
+        return array("B"), array("B"), array("q"), array("I")
+
+    def fraction(self):
+        """Roughly how much of the file has been read, 0 to 1"""
+        return min(1.0, self.progress[0] / self.size)
+
+    def write_report(self):
+        """Save rejected rows next to the imported file, returns the report path"""
+        report_path = self.path + ".rejected.csv"
+        with open(report_path, "w", newline="") as report:
+            writer = csv.writer(report)
+            writer.writerow(["line", "reason"])
+            writer.writerows(self.rejected)
+        return report_path
+
+class Import_Window(tk.Toplevel):
+    """Progress window for an Import_Job, hands each batch to apply_batch on the Tk thread"""
+    def __init__(self, master, job, apply_batch, on_done):
+        """Setup progress bar and start polling the job"""
+        super().__init__(master)
+        self.title("Importing")
+        self.job = job
+        self.apply_batch = apply_batch # callable(columns), adds one batch to the ledger and refreshes labels once
+        self.on_done = on_done # callable(job, imported, error), called once the job is finished
+        self.imported = 0
+
+        self.file_label = tk.Label(self, text=os.path.basename(job.path), padx=10)
+        self.file_label.pack(pady=5)
+        self.progress_bar = ttk.Progressbar(self, length=300, maximum=1.0)
+        self.progress_bar.pack(padx=10, pady=5)
+        self.count_label = tk.Label(self, text="Imported 0, rejected 0")
+        self.count_label.pack(pady=5)
+
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+        self.job.start()
+        self.poll_id = self.after(POLL_MS, self.poll)
+
+    def poll(self):
+        """Apply every finished batch, then check again later unless the job is done"""
+        while True:
+            try:
+                message = self.job.batches.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "done":
+                self.finish(message[1])
+                return
+            _, columns, rejected = message
+            if len(columns[2]):
+                self.apply_batch(columns)
+                self.imported += len(columns[2])
+            self.job.rejected.extend(rejected)
+        self.progress_bar["value"] = self.job.fraction()
+        self.count_label.config(text=f"Imported {self.imported}, rejected {len(self.job.rejected)}")
+        self.poll_id = self.after(POLL_MS, self.poll)
+
+    def cancel(self):
+        """Handler for closing the window, stops the worker, batches already added stay in the ledger"""
+        self.job.cancelled = True
+        self.finish("Import cancelled.")
+
+    def finish(self, error):
+        """Close the window and report"""
+        self.after_cancel(self.poll_id)
+        self.destroy()
+        self.on_done(self.job, self.imported, error)
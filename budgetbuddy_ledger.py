@@ -0,0 +1,163 @@
+"""Compact column storage for Budget Buddy transactions"""
+
+import math
+from array import array
+from contextlib import contextmanager
+from datetime import date
+from itertools import compress
+from operator import and_
+
+TRANSACTION_TYPES = ["Income", "Expense"] # type code is the index into this list
+INCOME_CATEGORIES = ["Salary", "Investments", "Miscellaneous"] # the app, the service and the tools all use these, ledger files only hold their codes
+EXPENSE_CATEGORIES = ["Bills", "Food", "Entertainment"]
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal() # days are stored as days since 1970-01-01
+CENTS_LIMIT = 1 << 63 # cents column is a signed 64-bit array
+DAY_LIMIT = date(2101, 1, 1).toordinal() - EPOCH_ORDINAL # days run from 1970 to the end of 2100, the trees and reports are sized by the span
+
+def to_cents(amount):
+    """Convert a dollar amount to whole cents, rounded to the nearest cent"""
+    return int(round(float(amount) * 100))
+
+def today():
+    """Today's date as a day number"""
+    return date.today().toordinal() - EPOCH_ORDINAL
+
+def check_day(day):
+    """Raise ValueError unless 'day' is a day number the ledger accepts, returns it"""
+    if not (isinstance(day, int) and 0 <= day < DAY_LIMIT):
+        raise ValueError("Please enter a date between 1970 and 2100.")
+    return day
+
+class Ledger_Store:
+    """Transactions kept as parallel typed arrays instead of a list of (type, category, amount) tuples"""
+    def __init__(self, income_categories, expense_categories):
+        """Build interning tables and empty columns"""
+        # Interning tables, names are stored once and rows only keep the small integer code
+        self.type_names = list(TRANSACTION_TYPES)
+        self.category_names = list(income_categories) + list(expense_categories) # income codes first, then expense
+        self.type_codes = {name: code for code, name in enumerate(self.type_names)}
+        self.category_codes = {name: code for code, name in enumerate(self.category_names)}
+        self.category_types = [0] * len(income_categories) + [1] * len(expense_categories) # category code -> type code
+
+        # One array per column, 15 bytes per row in total
+        self.types = array("B") # type code
+        self.categories = array("B") # category code
+        self.cents = array("q") # amount in cents, always positive, type gives the sign
+        self.days = array("I") # day the transaction happened, see today()
+        self.live = bytearray() # 1 per row, 0 once the row is deleted or replaced by an edit, rows themselves are never removed
+        self.dead = 0 # rows with live 0, most ledgers have none and skip the mask entirely
+
+    def __len__(self):
+        """Number of stored transactions"""
+        return len(self.cents)
+
+    def __getitem__(self, index):
+        """Row as the old (type, category, amount) tuple so display code does not care about codes"""
+        return (self.type_names[self.types[index]], self.category_names[self.categories[index]], self.cents[index] / 100)
+
+    def validate(self, transaction_type, category, amount):
+        """Check one entry with the same rules as the Submit button, returns cents or raises ValueError with the message to show"""
+        if not category or amount is None or amount == "":
+            raise ValueError("Please select a category and enter an amount.")
+        try:
+            amount = float(amount)
+        except (TypeError, ValueError):
+            raise ValueError("Please enter a numeric amount.")
+        if not math.isfinite(amount): # float() also accepts 'nan' and 'inf'
+            raise ValueError("Please enter a numeric amount.")
+        if amount < 0:
+            raise ValueError("Please enter a positive dollar amount. (Select Expense if not Income)")
+        if amount >= CENTS_LIMIT / 100: # checked before to_cents(), amounts from about 1e306 up turn into inf there
+            raise ValueError("Amount is too large.")
+        cents = to_cents(amount)
+        if cents >= CENTS_LIMIT: # rounding just under the limit can still land on it
+            raise ValueError("Amount is too large.")
+        category_code = self.category_codes.get(category)
+        if category_code is None or self.type_codes.get(transaction_type) != self.category_types[category_code]: # category has to belong to the type
+            raise ValueError("Please select a category from the list.")
+        return cents
+
+    def append(self, transaction_type, category, amount, day=None):
+        """Add one transaction dated 'day' (default today)
+
+        Raises KeyError for a type or category missing from the tables and
+        OverflowError for an amount or day the columns cannot hold.
+        """
+        type_code = self.type_codes[transaction_type]
+        category_code = self.category_codes[category]
+        cents = to_cents(amount)
+        day = today() if day is None else day
+        if not -CENTS_LIMIT <= cents < CENTS_LIMIT or not 0 <= day < DAY_LIMIT:
+            raise OverflowError("Transaction does not fit the ledger columns")
+        self.types.append(type_code) # everything is checked before touching the columns so a bad row adds nothing
+        self.categories.append(category_code)
+        self.cents.append(cents)
+        self.days.append(day)
+        self.live.append(1)
+
+    def extend(self, types, categories, cents, days):
+        """Append already validated rows given as code columns, e.g. arrays built by the importer"""
+        self.types.extend(types)
+        self.categories.extend(categories)
+        self.cents.extend(cents)
+        self.days.extend(days)
+        self.live.extend(b"\x01" * (len(self.cents) - len(self.live)))
+
+    def load_columns(self, types, categories, cents, days, byteswap=False):
+        """Append whole columns given as raw bytes, used when reading the ledger file"""
+        start = len(self.cents)
+        self.types.frombytes(types)
+        self.categories.frombytes(categories)
+        self.cents.frombytes(cents)
+        self.days.frombytes(days)
+        if byteswap: # file bytes are little-endian
+            added_cents = self.cents[start:]
+            added_days = self.days[start:]
+            added_cents.byteswap()
+            added_days.byteswap()
+            self.cents[start:] = added_cents
+            self.days[start:] = added_days
+        self.live.extend(b"\x01" * (len(self.cents) - start))
+
+    def set_live(self, row, alive):
+        """Mark a row live or dead, returns True if that changed anything"""
+        if self.live[row] == alive:
+            return False
+        self.live[row] = alive
+        self.dead += -1 if alive else 1
+        return True
+
+    def live_rows(self, start=0, stop=None):
+        """Live row numbers in [start, stop), ascending, a plain range while nothing is dead"""
+        stop = len(self) if stop is None else stop
+        if not self.dead:
+            return range(start, stop)
+        return array("I", compress(range(start, stop), self.live[start:stop]))
+
+    def dead_rows(self):
+        """Row numbers with live 0, found with a C-level pass over the mask"""
+        if not self.dead:
+            return array("I")
+        return array("I", compress(range(len(self)), self.live.translate(bytes([1]) + bytes(255)))) # 0 -> 1, 1 -> 0
+
+    def total_cents(self):
+        """Income minus expenses over every live row, done with C-level sum() rather than a Python loop"""
+        if not self.dead:
+            expense = sum(compress(self.cents, self.types)) # Expense is type code 1, so the type column works as the selector
+            return sum(self.cents) - 2 * expense
+        expense = sum(compress(self.cents, map(and_, self.types, self.live)))
+        return sum(compress(self.cents, self.live)) - 2 * expense
+
+    @contextmanager
+    def column_views(self):
+        """Zero-copy memoryviews of (types, categories, cents, days) for aggregation, released when the with block ends
+
+        An array cannot grow while a view of it is alive, so nothing inside the
+        block may append to the store.
+        """
+        views = tuple(map(memoryview, (self.types, self.categories, self.cents, self.days)))
+        try:
+            yield views
+        finally:
+            for view in views:
+                view.release()
@@ -0,0 +1,71 @@
+"""Reports window: monthly income and expenses by category, trends and a month-end forecast"""
+
+import tkinter as tk
+from tkinter import ttk
+from budgetbuddy_analytics import MOVING_AVERAGE_MONTHS
+
+REFRESH_DELAY_MS = 500 # new transactions are redrawn at most this often
+
+def dollars(cents):
+    """Cents as a $ string for the table"""
+    return f"${cents / 100:,.2f}"
+
+class Reports_Window(tk.Toplevel):
+    """One row per month, newest first, kept current while transactions come in"""
+    def __init__(self, master, analytics, **kwargs):
+        """Setup forecast label and month table"""
+        super().__init__(master, **kwargs)
+        self.title("Reports")
+        self.analytics = analytics # Analytics, holds the per-month cache between openings
+        self.refresh_job = None # pending after() id
+
+        self.forecast_label = tk.Label(self, anchor="w", padx=10)
+        self.forecast_label.pack(fill="x", pady=5)
+
+        # Month table, fixed columns then one per category
+        categories = analytics.ledger.store.category_names
+        self.columns = ["month", "income", "expense", "net", "savings", "average_expense", "average_net"] + categories
+        headings = ["Month", "Income", "Expenses", "Net", "Savings Rate",
+                    f"{MOVING_AVERAGE_MONTHS}-Mo Avg Expenses", f"{MOVING_AVERAGE_MONTHS}-Mo Avg Net"] + categories
+        table_frame = tk.Frame(self)
+        table_frame.pack(fill="both", expand=True, padx=5, pady=5)
+        self.table = ttk.Treeview(table_frame, columns=self.columns, show="headings", height=15)
+        for column, heading in zip(self.columns, headings):
+            self.table.heading(column, text=heading)
+            self.table.column(column, width=70 if column == "month" else 110, anchor="e")
+        scrollbar = tk.Scrollbar(table_frame, orient="vertical", command=self.table.yview)
+        self.table.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.table.pack(side=tk.LEFT, fill="both", expand=True)
+
+        self.refresh()
+        analytics.ledger.subscribe(self.schedule_refresh)
+        analytics.ledger.subscribe_changes(self.schedule_refresh)
+        self.bind("<Destroy>", self.on_destroy)
+
+    def schedule_refresh(self, *changes):
+        """Ledger listener for new and changed rows, batches a burst of them into one redraw"""
+        if self.refresh_job is None:
+            self.refresh_job = self.after(REFRESH_DELAY_MS, self.refresh)
+
+    def refresh(self):
+        """Redraw from the analytics cache, only months that got new transactions are recomputed"""
+        self.refresh_job = None
+        rollup = self.analytics.monthly_rollup()
+        self.table.delete(*self.table.get_children())
+        for row in reversed(rollup): # newest month on top
+            year, month = row["month"]
+            savings = "-" if row["savings_rate"] is None else f"{row['savings_rate']:.0%}"
+            values = [f"{year}-{month:02d}", dollars(row["income"]), dollars(row["expense"]), dollars(row["net"]), savings,
+                      dollars(row["average_expense"]), dollars(row["average_net"])]
+            values += [dollars(cents) for cents in row["categories"].values()]
+            self.table.insert("", tk.END, values=values)
+        self.forecast_label.config(text=f"Forecast end of month balance: {dollars(self.analytics.forecast())}")
+
+    def on_destroy(self, event):
+        """Stop listening once the window is gone"""
+        if event.widget is self:
+            self.analytics.ledger.unsubscribe(self.schedule_refresh)
+            self.analytics.ledger.unsubscribe_changes(self.schedule_refresh)
+            if self.refresh_job:
+                self.after_cancel(self.refresh_job)
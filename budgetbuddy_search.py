@@ -0,0 +1,126 @@
+"""Indexes behind the transaction history search"""
+
+import bisect
+from array import array
+from itertools import chain, compress
+from budgetbuddy_ledger import to_cents
+
+MAX_RUN_ROWS = 1 << 17 # amount runs stop merging at this size, so no single catch-up re-sorts more than this
+
+class Search_Index:
+    """Posting lists per type and category plus amount-sorted runs, kept up to date by the ledger or caught up before a query
+
+    The amount index is a short list of sorted runs rather than one array: new
+    rows become a run of their own and runs of similar size are merged, so
+    indexing a chunk never re-sorts the whole ledger.
+    """
+    def __init__(self, store):
+        """Empty index, rows are added by catch_up()"""
+        self.store = store
+        self.rows = 0 # store rows indexed so far
+        self.by_category = [array("I") for _ in store.category_names] # row numbers, ascending
+        self.amount_runs = [] # (cents ascending, row number for each) pairs of arrays, largest first
+        self.selectors = [bytes(code == category_code for code in range(256)) for category_code in range(len(store.category_names))]
+
+    def catch_up(self, limit=None):
+        """Index at most 'limit' store rows added since the last call (all of them by default), returns True once none are left"""
+        start = self.rows
+        stop = len(self.store) if limit is None else min(len(self.store), start + limit)
+        if start < stop:
+            categories = self.store.categories[start:stop].tobytes()
+            for category_code in set(categories): # C-level pass per category, no per-row Python
+                self.by_category[category_code].extend(compress(range(start, stop), categories.translate(self.selectors[category_code])))
+            self.add_run(sorted(range(start, stop), key=self.store.cents.__getitem__))
+            self.rows = stop
+        return self.rows == len(self.store)
+
+    def add_run(self, rows):
+        """Add rows sorted by amount as a run, then merge it with runs no more than twice its size"""
+        cents = self.store.cents
+        runs = self.amount_runs
+        runs.append((array("q", map(cents.__getitem__, rows)), array("I", rows)))
+        while len(runs) > 1 and len(runs[-2][1]) <= 2 * len(runs[-1][1]) and len(runs[-2][1]) + len(runs[-1][1]) <= MAX_RUN_ROWS:
+            _, newer = runs.pop()
+            _, older = runs.pop()
+            rows = sorted(chain(older, newer), key=cents.__getitem__) # two sorted runs, timsort just merges them
+            runs.append((array("q", map(cents.__getitem__, rows)), array("I", rows)))
+
+    def amount_slices(self, low, high):
+        """Row numbers with cents in [low, high] as one array slice per run, None for an open end"""
+        slices = []
+        for run_cents, run_rows in self.amount_runs:
+            first = 0 if low is None else bisect.bisect_left(run_cents, low)
+            last = len(run_cents) if high is None else bisect.bisect_right(run_cents, high)
+            slices.append(run_rows[first:last])
+        return slices
+
+    def compile(self, transaction_type=None, category=None, min_amount=None, max_amount=None, text=""):
+        """Turn search filters into (allowed category codes, low cents, high cents), None for an open end
+
+        Free text words match type or category names ('food', 'inc'), or an exact
+        amount if the word is a number ('250' finds $250.00).
+        """
+        store = self.store
+        allowed = set(range(len(store.category_names)))
+        low = to_cents(min_amount) if min_amount is not None else None
+        high = to_cents(max_amount) if max_amount is not None else None
+
+        if transaction_type:
+            type_code = store.type_codes.get(transaction_type)
+            allowed &= {code for code, category_type in enumerate(store.category_types) if category_type == type_code}
+        if category:
+            allowed &= {store.category_codes.get(category)}
+        for word in text.lower().split():
+            try:
+                exact = to_cents(word.lstrip("$").replace(",", ""))
+            except (ValueError, OverflowError):
+                allowed &= {code for code, name in enumerate(store.category_names)
+                            if word in name.lower() or word in store.type_names[store.category_types[code]].lower()}
+            else:
+                low = exact if low is None else max(low, exact)
+                high = exact if high is None else min(high, exact)
+        return allowed, low, high
+
+    def is_open(self, query):
+        """True if a compiled query lets every row through"""
+        allowed, low, high = query
+        return len(allowed) == len(self.store.category_names) and low is None and high is None
+
+    def search(self, transaction_type=None, category=None, min_amount=None, max_amount=None, text=""):
+        """Row numbers matching every filter, ascending, cost grows with the matches rather than the ledger"""
+        return self.run(self.compile(transaction_type, category, min_amount, max_amount, text))
+
+    def run(self, query):
+        """Live row numbers for a compiled query, deleted and edited-away rows stay in the index and are skipped here"""
+        store = self.store
+        allowed, low, high = query
+        if not allowed or low is not None and high is not None and low > high:
+            return array("I")
+        if self.is_open(query):
+            return store.live_rows() # no filter, a range while nothing is deleted
+        self.catch_up() # normally a no-op, the window builds the index in the background after opening
+
+        # Candidates from whichever index gives the shorter list
+        if low is None and high is None:
+            from_categories = True # amount index is no help without a range
+        else:
+            amount_slices = self.amount_slices(low, high)
+            from_categories = sum(len(self.by_category[code]) for code in allowed) < sum(map(len, amount_slices))
+        if from_categories:
+            postings = [self.by_category[code] for code in allowed]
+            rows = array("I", postings[0]) if len(postings) == 1 else array("I", sorted(chain.from_iterable(postings))) # sorted runs, timsort merges them
+            if low is None and high is None:
+                return array("I", compress(rows, map(store.live.__getitem__, rows))) if store.dead else rows
+            return self.filter_rows(query, rows)
+        categories = store.categories
+        live = store.live
+        return array("I", sorted(row for row in chain.from_iterable(amount_slices) if categories[row] in allowed and live[row]))
+
+    def filter_rows(self, query, rows):
+        """Live rows from an ascending iterable that pass a compiled query, used for candidates and for newly added rows"""
+        allowed, low, high = query
+        categories = self.store.categories
+        cents = self.store.cents
+        live = self.store.live
+        return array("I", (row for row in rows if live[row] and categories[row] in allowed
+                           and (low is None or cents[row] >= low) and (high is None or cents[row] <= high)))
@@ -0,0 +1,220 @@
+"""Local HTTP/JSON entry point for scripts and other people, run headless with: python budgetbuddy_server.py [--port 8765] [--ledger budgetbuddy.ledger]
+
+POST /transactions takes one {"type", "category", "amount", "date"} object or a
+list of them (date is optional, same formats as the importer), GET /total returns
+the running total. Posts are validated on the server thread and queued, whoever
+owns the ledger drains the queue and adds everything waiting as one batch with
+one commit, so many small posts cost about as much as one big one.
+"""
+
+import argparse
+import asyncio
+import json
+import queue
+import threading
+from array import array
+from budgetbuddy_import import parse_day
+
+DEFAULT_PORT = 8765
+DRAIN_MS = 10 # how often the window drains the queue, posts wait at most about this long
+MAX_DRAIN_ROWS = 50000 # rows added per drain, more waits for the next one so the window stays responsive
+MAX_BODY = 16 << 20 # bytes, larger requests are refused
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+class Ingest_Service:
+    """asyncio HTTP server on its own thread, validated posts wait in a thread-safe queue for drain()"""
+    def __init__(self, store, host="127.0.0.1", port=DEFAULT_PORT):
+        """Nothing runs until start(), only the store's tables are read from the server thread"""
+        self.store = store # Ledger_Store, for validate() and the code tables
+        self.host = host # localhost only unless asked otherwise
+        self.port = port # 0 picks a free port, the real one is set once started
+        self.batches = queue.Queue() # (columns, future) per post with accepted rows
+        self.total = 0.0 # running total as of the last drain, answered by GET /total
+        self.count = 0 # live transactions as of the last drain
+        self.loop = None
+        self.server = None
+        self.started = threading.Event()
+        self.error = None # exception that stopped the server from starting
+        self.thread = threading.Thread(target=self.run, daemon=True) # never keeps the app open
+
+    def start(self):
+        """Start the server thread and wait until it is listening, raises OSError if the port is taken"""
+        self.thread.start()
+        self.started.wait()
+        if self.error:
+            raise self.error
+
+    def run(self):
+        """Server thread, owns the event loop"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self.handle_client, self.host, self.port))
+        except OSError as error:
+            self.error = error
+            self.started.set()
+            return
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.started.set()
+        self.loop.run_forever()
+        self.server.close()
+        connections = asyncio.all_tasks(self.loop) # idle keep-alive clients would otherwise hold the loop open
+        for connection in connections:
+            connection.cancel()
+        self.loop.run_until_complete(asyncio.gather(*connections, return_exceptions=True))
+        self.loop.close()
+
+    def stop(self):
+        """Stop listening, posts still waiting get no reply"""
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=2)
+
+    async def handle_client(self, reader, writer):
+        """One connection, keep-alive requests are answered in order"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    self.respond(writer, 413, {"error": "Request body is too large."}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.route(method, target.split("?")[0], body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                self.respond(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass # client went away or sent something that is not HTTP
+        except asyncio.CancelledError:
+            pass # server stopping, end quietly
+        finally:
+            writer.close()
+
+    def respond(self, writer, status, payload, keep_alive):
+        """Write one JSON response"""
+        body = json.dumps(payload).encode()
+        writer.write((f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode() + body)
+
+    async def route(self, method, path, body):
+        """(status, payload) for one request"""
+        if path == "/total":
+            if method != "GET":
+                return 405, {"error": "Use GET."}
+            return 200, {"total": self.total, "transactions": self.count}
+        if path == "/transactions":
+            if method != "POST":
+                return 405, {"error": "Use POST."}
+            try:
+                posted = json.loads(body)
+            except ValueError:
+                return 400, {"error": "Body is not valid JSON."}
+            return 200, await self.ingest(posted if isinstance(posted, list) else [posted])
+        return 404, {"error": f"No such path {path}."}
+
+    async def ingest(self, entries):
+        """Validate like the Submit button, queue the good rows and wait until they are in the ledger"""
+        store = self.store
+        types, categories, cents, days = array("B"), array("B"), array("q"), array("I")
+        rejected = []
+        for index, entry in enumerate(entries):
+            try:
+                if not isinstance(entry, dict):
+                    raise ValueError("Each transaction must be a JSON object.")
+                transaction_type, category = str(entry.get("type") or ""), str(entry.get("category") or "") # strings like the entry widgets give
+                amount = entry.get("amount")
+                if isinstance(amount, bool) or not isinstance(amount, (str, int, float, type(None))): # true would pass float() as 1.0
+                    raise ValueError("Please enter a numeric amount.")
+                amount = store.validate(transaction_type, category, amount)
+                day = parse_day(str(entry.get("date") or ""))
+            except ValueError as error:
+                rejected.append({"index": index, "error": str(error)})
+                continue
+            types.append(store.type_codes[transaction_type])
+            categories.append(store.category_codes[category])
+            cents.append(amount)
+            days.append(day)
+        total = self.total
+        if len(cents):
+            future = self.loop.create_future()
+            self.batches.put(((types, categories, cents, days), future))
+            total = await future # set by drain() once the rows are added and committed
+        return {"accepted": len(cents), "rejected": rejected, "total": total}
+
+    def drain(self, ledger, timeout=None):
+        """Add every queued post to the ledger as one batch and commit once, returns rows added
+
+        Runs on the thread that owns the ledger, the window calls it from an
+        after() timer. With a timeout it first waits that long for a post.
+        """
+        waiting = []
+        rows = 0
+        try:
+            waiting.append(self.batches.get(timeout=timeout) if timeout else self.batches.get_nowait())
+            rows += len(waiting[-1][0][2])
+            while rows < MAX_DRAIN_ROWS:
+                waiting.append(self.batches.get_nowait())
+                rows += len(waiting[-1][0][2])
+        except queue.Empty:
+            pass
+        if not waiting:
+            return 0
+        columns = tuple(array(column.typecode) for column in waiting[0][0])
+        for posted, _ in waiting:
+            for column, values in zip(columns, posted):
+                column.extend(values)
+        ledger.extend(*columns, undoable=False) # posts from other clients are not the window user's to undo
+        ledger.commit()
+        self.update_totals(ledger)
+        for _, future in waiting:
+            self.loop.call_soon_threadsafe(resolve, future, self.total)
+        return rows
+
+    def update_totals(self, ledger):
+        """Copy the numbers GET /total answers with, called on the ledger's thread"""
+        self.total = ledger.total()
+        self.count = len(ledger.store) - ledger.store.dead
+
+def resolve(future, total):
+    """Hand the total to a waiting post, unless its client already gave up"""
+    if not future.done():
+        future.set_result(total)
+
+def main(argv=None):
+    """Headless server, for when the window is not running (only one of them may write a ledger)"""
+    from budgetbuddy_core import Budget_Ledger
+    from budgetbuddy_ledger import INCOME_CATEGORIES, EXPENSE_CATEGORIES
+    parser = argparse.ArgumentParser(description="Budget Buddy ingestion service")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--ledger", default="budgetbuddy.ledger")
+    args = parser.parse_args(argv)
+
+    ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES, args.ledger)
+    service = Ingest_Service(ledger.store, port=args.port)
+    service.update_totals(ledger)
+    service.start()
+    print(f"Listening on http://{service.host}:{service.port}, Ctrl+C to stop")
+    try:
+        while True:
+            service.drain(ledger, timeout=1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        ledger.close()
+
+if __name__ == "__main__":
+    main()
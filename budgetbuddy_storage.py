@@ -0,0 +1,188 @@
+"""Append-only ledger file so transactions survive closing the app"""
+
+import mmap
+import os
+import struct
+import sys
+
+HEADER = struct.Struct("<8sHH4x") # magic, format version, record size
+MAGIC = b"BBLEDGER"
+VERSION = 1
+RECORD = struct.Struct("<qIBB2x") # cents, day, type code, category code, padded to 16 bytes
+
+class Ledger_File:
+    """Fixed-size binary records appended to one file, fsynced in groups"""
+    def __init__(self, path, commit_every=64):
+        """Nothing is opened until load()"""
+        self.path = path
+        self.commit_every = commit_every # records per fsync, the app also commits on a timer
+        self.pending = 0 # records written since the last fsync
+        self.file = None
+
+    def load(self, store, read_only=False):
+        """Open or create the file and fill the store's columns from it, returns records loaded
+
+        With read_only the file must exist, a torn tail is skipped rather than cut
+        off and the file is closed again afterwards, for tools that only read ledgers.
+        """
+        if not os.path.exists(self.path) and not read_only:
+            with open(self.path + ".tmp", "wb") as new_file:
+                new_file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+                new_file.flush()
+                os.fsync(new_file.fileno())
+            os.replace(self.path + ".tmp", self.path) # a crash never leaves an empty or half-written header behind
+
+        self.file = open(self.path, "rb" if read_only else "r+b")
+        header = self.file.read(HEADER.size)
+        if len(header) < HEADER.size or HEADER.unpack(header) != (MAGIC, VERSION, RECORD.size):
+            self.file.close()
+            raise ValueError(f"{self.path} is not a Budget Buddy ledger file")
+
+        # A crash in the middle of a write leaves a partial record at the end, cut it off
+        size = os.fstat(self.file.fileno()).st_size
+        torn = (size - HEADER.size) % RECORD.size
+        if torn:
+            size -= torn
+            if not read_only: # a reader leaves the file alone, the app cuts the tail off next time it opens it
+                print(f"Ledger {self.path}: dropping {torn} bytes of an incomplete record") # same as other load errors, print and carry on
+                self.file.truncate(size)
+                os.fsync(self.file.fileno())
+
+        count = (size - HEADER.size) // RECORD.size
+        try:
+            if count:
+                self.read_columns(store, size)
+        finally:
+            if read_only:
+                self.close()
+        if self.file:
+            self.file.seek(0, os.SEEK_END) # everything after this is appends
+        return count
+
+    def read_columns(self, store, size):
+        """Copy each field out of the mapped records with strided slices, no per-record Python code"""
+        with mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as whole:
+                records = whole[HEADER.size:size]
+                stride = RECORD.size
+                cents = records.cast("q")[0::stride // 8].tobytes() # bytes 0-7 of each record
+                days = records.cast("I")[2::stride // 4].tobytes() # bytes 8-11
+                types = records[12::stride].tobytes()
+                categories = records[13::stride].tobytes()
+                records.release()
+        if types.translate(None, bytes(range(len(store.type_names)))) or categories.translate(None, bytes(range(len(store.category_names)))): # anything left after deleting the known codes
+            raise ValueError(f"{self.path} has categories this version of Budget Buddy does not know")
+        store.load_columns(types, categories, cents, days, byteswap=sys.byteorder == "big") # file is little-endian
+
+    def write_rows(self, store, start, stop):
+        """Append store rows [start, stop) to the file, fsync once enough have piled up"""
+        self.file.write(b"".join(map(RECORD.pack, store.cents[start:stop], store.days[start:stop], store.types[start:stop], store.categories[start:stop])))
+        self.pending += stop - start
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        """Flush and fsync whatever has been written since the last commit"""
+        if self.pending and self.file:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+
+    def close(self):
+        """Commit and close"""
+        if self.file:
+            self.commit()
+            self.file.close()
+            self.file = None
+
+EVENT_HEADER = struct.Struct("<8sHH4xQQ") # magic, format version, record size, number of the first event, state records before it
+EVENT_MAGIC = b"BBEVENTS"
+EVENT = struct.Struct("<BBxxII") # operation, operation being undone or redone, two row numbers
+
+class Event_Log:
+    """Edits, deletes, undos and redos as fixed-size records appended to a file next to the ledger
+
+    Compaction swaps the file for one holding only a state record per dead row,
+    so the file stays small however long the history gets.
+    """
+    def __init__(self, path):
+        """Nothing is opened until load()"""
+        self.path = path
+        self.base = 0 # number of the first event in the file, everything before it was compacted away
+        self.state_count = 0 # state records at the start of the file, ahead of the events
+        self.pending = 0 # records written since the last fsync
+        self.file = None
+
+    def load(self, read_only=False):
+        """Open or create the file, returns (state records, events) as lists of (operation, undone, row, row) tuples
+
+        With read_only a missing file counts as empty, a torn tail is skipped
+        rather than cut off and the file is closed again afterwards.
+        """
+        if not os.path.exists(self.path):
+            if read_only:
+                return [], []
+            self.write_file(0, [])
+        self.file = open(self.path, "rb" if read_only else "r+b")
+        header = self.file.read(EVENT_HEADER.size)
+        if len(header) < EVENT_HEADER.size or EVENT_HEADER.unpack(header)[:3] != (EVENT_MAGIC, VERSION, EVENT.size):
+            self.file.close()
+            raise ValueError(f"{self.path} is not a Budget Buddy event log")
+        self.base, self.state_count = EVENT_HEADER.unpack(header)[3:]
+        data = self.file.read()
+        torn = len(data) % EVENT.size
+        if torn:
+            data = data[:len(data) - torn]
+            if not read_only:
+                print(f"Event log {self.path}: dropping {torn} bytes of an incomplete record") # same as the ledger file
+                self.file.truncate(EVENT_HEADER.size + len(data))
+                os.fsync(self.file.fileno())
+        records = list(EVENT.iter_unpack(data))
+        if read_only:
+            self.close()
+        else:
+            self.file.seek(0, os.SEEK_END)
+        return records[:self.state_count], records[self.state_count:]
+
+    def append(self, event):
+        """Write one event, it becomes durable on the next commit()"""
+        self.file.write(EVENT.pack(*event))
+        self.pending += 1
+
+    def truncate(self, events):
+        """Drop everything after the first 'events' events, for a tail that refers to rows the ledger file lost"""
+        self.file.truncate(EVENT_HEADER.size + (self.state_count + events) * EVENT.size)
+        os.fsync(self.file.fileno())
+        self.file.seek(0, os.SEEK_END)
+
+    def compact(self, base, state_records):
+        """Replace the file with just the state records, the next event written is number 'base'"""
+        self.close()
+        self.write_file(base, state_records)
+        self.base = base
+        self.state_count = len(state_records)
+        self.file = open(self.path, "r+b")
+        self.file.seek(0, os.SEEK_END)
+
+    def write_file(self, base, state_records):
+        """Replace the file with a header plus records, fsynced, a crash leaves either the old file or the new one"""
+        with open(self.path + ".tmp", "wb") as new_file:
+            new_file.write(EVENT_HEADER.pack(EVENT_MAGIC, VERSION, EVENT.size, base, len(state_records)))
+            new_file.write(b"".join(EVENT.pack(*record) for record in state_records))
+            new_file.flush()
+            os.fsync(new_file.fileno())
+        os.replace(self.path + ".tmp", self.path)
+
+    def commit(self):
+        """Flush and fsync the events written since the last commit"""
+        if self.pending and self.file:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+
+    def close(self):
+        """Commit and close"""
+        if self.file:
+            self.commit()
+            self.file.close()
+            self.file = None
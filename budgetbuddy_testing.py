@@ -1,7 +1,20 @@
 """Welcome to the testing grounds, put into seperate file for organization"""
 
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
 import tkinter as tk
 from budgetbuddy import Budget_Buddy # imports Budget_Buddy class
+from budgetbuddy_aggregates import day_number
+from budgetbuddy_core import Budget_Ledger # headless core, no display needed
+from budgetbuddy_import import Import_Job
+from budgetbuddy_ledger import INCOME_CATEGORIES, EXPENSE_CATEGORIES
+from budgetbuddy_server import Ingest_Service
+from budgetbuddy_storage import HEADER, RECORD # ledger file layout, checked by the round trips
 
 # Testing Data kinda works
 test_transactions = [ 
@@ -26,11 +39,210 @@ def simulate_transactions(app):
         app.amount_entry.insert(0, str(transaction["amount"]))          # Enter the amount
         app.submit_entry()                                              # Submit the entry
 
+# Same data as one batch, labels only update once
+def simulate_batch(app):
+    app.submit_batch([str(transaction["transaction_type"]) for transaction in test_transactions],
+                     [transaction["category"] for transaction in test_transactions],
+                     [transaction["amount"] for transaction in test_transactions])
+
+# Same data straight into the headless core
+def simulate_ledger(ledger):
+    for transaction in test_transactions:
+        try:
+            ledger.submit(str(transaction["transaction_type"]), transaction["category"], str(transaction["amount"])) # str() like the entry widgets
+            print("Accepted:", transaction)
+        except ValueError as error:
+            print("Rejected:", transaction, "-", error)
+    print(f"Total Finances: ${ledger.total():.2f}")
+
+# Fix the last entry, delete the first, then change our mind
+def simulate_undo(ledger):
+    ledger.edit(len(ledger) - 1, "Expense", "Food", "50")  # Bills $500 becomes Food $50
+    print(f"After edit: ${ledger.total():.2f}")
+    ledger.delete(0)
+    print(f"After delete: ${ledger.total():.2f}")
+    ledger.undo()                                           # delete undone
+    ledger.undo()                                           # edit undone
+    print(f"After two undos: ${ledger.total():.2f}")
+    ledger.redo()                                           # edit back
+    print(f"After redo: ${ledger.total():.2f}")
+
+# What has to survive a reopen: total, which rows are live, row count
+def snapshot(ledger):
+    return ledger.total(), bytes(ledger.store.live), len(ledger)
+
+# Write a ledger file, reopen it from the checkpoint, then again after tearing the last record like a crash mid-write
+def check_reopen(directory):
+    path = os.path.join(directory, "reopen.ledger")
+    ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES, path)
+    for transaction in test_transactions[-2:]:                  # the two good rows
+        ledger.submit(transaction["transaction_type"], transaction["category"], str(transaction["amount"]))
+    ledger.submit("Expense", "Food", "12.34", 19000)            # dated 2022-01-08
+    saved = snapshot(ledger)
+    ledger.close()
+
+    assert RECORD.size == 16, "records are 16 bytes"
+    assert os.path.getsize(path) == HEADER.size + RECORD.size * saved[2], "one record per transaction after the header"
+    with open(path, "rb") as ledger_file:
+        ledger_file.seek(HEADER.size + 2 * RECORD.size)
+        expected = (1234, 19000, ledger.store.type_codes["Expense"], ledger.store.category_codes["Food"])
+        assert RECORD.unpack(ledger_file.read(RECORD.size)) == expected, "cents, day, type code, category code"
+
+    reopened = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES, path)
+    assert snapshot(reopened) == saved, "same totals and rows after reopening"
+    assert reopened.checkpoint_rows == saved[2], "totals came from the checkpoint, not a rebuild"
+    reopened.close()
+
+    with open(path, "ab") as ledger_file:
+        ledger_file.write(b"torn")                              # part of a record that never finished
+    reopened = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES, path)
+    assert snapshot(reopened) == saved, "torn tail dropped, everything before it kept"
+    reopened.close()
+    assert os.path.getsize(path) == HEADER.size + RECORD.size * saved[2], "torn tail cut off the file"
+    print("Reopen, checkpoint and torn tail checks passed")
+
+# Edit, delete and undo, then "crash" without a checkpoint so the reopen has to replay the event log
+def check_replay(directory):
+    path = os.path.join(directory, "replay.ledger")
+    ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES, path)
+    simulate_ledger(ledger)
+    ledger.save_checkpoint()                                    # the events below come after it
+    simulate_undo(ledger)
+    before_delete = snapshot(ledger)
+    ledger.delete(1)
+    saved = snapshot(ledger)
+    stacks = ledger.history.snapshot()
+    ledger.commit()                                             # durable, but no new checkpoint
+    ledger.ledger_file.close()
+    ledger.event_log.close()
+
+    reopened = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES, path)
+    assert snapshot(reopened) == saved, "same totals and live rows after replaying the events"
+    assert reopened.history.snapshot() == stacks, "same undo and redo stacks after replaying the events"
+    reopened.undo()
+    assert snapshot(reopened) == before_delete, "undo after reopening brings the deleted row back"
+    reopened.close()
+    print("Event replay checks passed")
+
+# Import a bank CSV on this thread: good rows land in the ledger, an oversized amount, a far-future date and an unknown category are rejected by line
+def check_import(directory):
+    path = os.path.join(directory, "bank.csv")
+    with open(path, "w", newline="") as bank_file:
+        bank_file.write("Date,Category,Amount\n"
+                        "2024-09-24,Salary,1500.00\n"              # no Type column, the sign decides
+                        "09/25/2024,Food,\"-$1,234.56\"\n"
+                        "2024-09-26,Food,-1e308\n"                 # too large for the cents column
+                        "12/31/9999,Bills,-50\n"                   # past 2100
+                        "2024-09-27,Rent,-10\n")                   # not a category
+    ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES) # in memory, nothing saved
+    job = Import_Job(ledger.store, path)
+    job.run()                                                   # the window runs this on a worker thread
+    while True:                                                 # same loop as Import_Window.poll
+        message = job.batches.get_nowait()
+        if message[0] == "done":
+            break
+        _, columns, rejected = message
+        ledger.extend(*columns)
+        job.rejected.extend(rejected)
+    assert message[1] is None, "the import finished, bad rows do not stop it"
+    assert len(ledger) == 2 and round(ledger.total(), 2) == 265.44, "the two good rows were added"
+    assert ledger.store.days[1] == day_number(2024, 9, 25), "US style dates are read"
+    assert [line for line, _ in job.rejected] == [4, 5, 6], "each bad row is reported with its line number"
+    assert job.rejected[0][1] == "Amount is too large." and "2100" in job.rejected[1][1], "with the reason for it"
+    print("Import checks passed")
+
+# Date range totals from the Fenwick trees against adding up the rows by hand, with some rows deleted
+def check_range_totals():
+    rng = random.Random(11)
+    ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES)
+    categories = [rng.choice(INCOME_CATEGORIES + EXPENSE_CATEGORIES) for _ in range(2000)]
+    types = ["Income" if category in INCOME_CATEGORIES else "Expense" for category in categories]
+    amounts = [f"{rng.uniform(1, 500):.2f}" for _ in categories]
+    days = [day_number(2023, 1, 1) + rng.randrange(730) for _ in categories]
+    assert ledger.submit_batch(types, categories, amounts, days) == [], "every row is valid"
+    for row in rng.sample(range(len(ledger)), 50):
+        ledger.delete(row)
+    store = ledger.store
+    for _ in range(200):
+        first = day_number(2023, 1, 1) + rng.randrange(730)
+        last = first + rng.randrange(120)
+        category = rng.choice(categories)
+        expected = sum(store.cents[row] for row in store.live_rows()
+                       if store.category_names[store.categories[row]] == category and first <= store.days[row] <= last)
+        assert ledger.aggregates.category_total(category, first, last) == expected, f"{category} from day {first} to {last}"
+    assert round(ledger.aggregates.net() / 100, 2) == round(ledger.total(), 2), "range totals add up to the running total"
+    print("Range total checks passed")
+
+# Search results against filtering every row by hand
+def check_search():
+    rng = random.Random(12)
+    ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES)
+    for _ in range(1000):
+        category = rng.choice(INCOME_CATEGORIES + EXPENSE_CATEGORIES)
+        ledger.submit("Income" if category in INCOME_CATEGORIES else "Expense", category, f"{rng.uniform(1, 100):.2f}")
+    for row in rng.sample(range(len(ledger)), 30):
+        ledger.delete(row)
+    store = ledger.store
+    for transaction_type, category, low, high in (("Expense", "Food", 10, 20), (None, None, 50, None), ("Income", None, None, 5), (None, "Bills", None, None)):
+        expected = [row for row in store.live_rows()
+                    if (transaction_type is None or store[row][0] == transaction_type) and (category is None or store[row][1] == category)
+                    and (low is None or store.cents[row] >= low * 100) and (high is None or store.cents[row] <= high * 100)]
+        assert list(ledger.search(transaction_type, category, low, high)) == expected, f"search {transaction_type} {category} {low}-{high}"
+    print("Search checks passed")
+
+# Post to the ingest service on a free port, good rows reach the ledger and bad ones come back with a reason
+def check_service():
+    ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES)
+    service = Ingest_Service(ledger.store, port=0)
+    service.start()
+    replies = []
+
+    def post(): # waits for drain() below, like a client waiting on the window
+        connection = http.client.HTTPConnection(service.host, service.port, timeout=10)
+        connection.request("POST", "/transactions", json.dumps([
+            {"type": "Income", "category": "Salary", "amount": "1000", "date": "2024-09-24"},
+            {"type": "Expense", "category": "Food", "amount": 25.5},
+            {"type": "Expense", "category": "Food", "amount": True},             # JSON true is not $1.00
+            {"type": "Expense", "category": "Food", "amount": "1e308"},
+            {"type": "Expense", "category": "Bills", "amount": "5", "date": "12/31/9999"},
+        ]))
+        replies.append(json.loads(connection.getresponse().read()))
+        connection.request("GET", "/total")
+        replies.append(json.loads(connection.getresponse().read()))
+        connection.close()
+    client = threading.Thread(target=post)
+    client.start()
+    try:
+        assert service.drain(ledger, timeout=10) == 2, "the two good rows were queued"
+        client.join(timeout=10)
+    finally:
+        service.stop()
+    posted, total = replies
+    assert posted["accepted"] == 2 and posted["total"] == 974.5, "the reply carries the new total"
+    assert [rejected["index"] for rejected in posted["rejected"]] == [2, 3, 4], "bool, oversized and far-future rows are rejected"
+    assert total == {"total": 974.5, "transactions": 2}, "GET /total sees the drained rows"
+    assert len(ledger) == 2, "only the good rows are in the ledger"
+    print("Ingest service checks passed")
+
 # Main
-if __name__ == "__main__":
+if __name__ == "__main__" and "--headless" in sys.argv:
+    ledger = Budget_Ledger(INCOME_CATEGORIES, EXPENSE_CATEGORIES) # in memory, nothing saved
+    simulate_ledger(ledger)
+    simulate_undo(ledger)
+    with tempfile.TemporaryDirectory() as directory:            # file round trips, nothing left behind
+        check_reopen(directory)
+        check_replay(directory)
+        check_import(directory)
+    check_range_totals()
+    check_search()
+    check_service()
+elif __name__ == "__main__":
     root = tk.Tk()
-    app = Budget_Buddy(root)
-    simulate_transactions(app)  # Run simulation
+    app = Budget_Buddy(root, ledger_path="budgetbuddy_testing.ledger") # keep test runs out of the real ledger
+    if "--batch" in sys.argv:
+        simulate_batch(app)     # Run simulation as one batch
+    else:
+        simulate_transactions(app)  # Run simulation
     root.mainloop()
 # End of Testing
 
@@ -0,0 +1,82 @@
+"""Undo and redo stacks built from ledger events"""
+
+ADD = 1 # rows [row, other) were added by a submit, batch or import
+DELETE = 2 # row was deleted
+EDIT = 3 # row was replaced by the new row 'other'
+UNDO = 4 # the action in 'undone' on (row, other) was reversed
+REDO = 5 # the action in 'undone' on (row, other) was applied again
+DEAD = 6 # state record written by compaction, row is dead, not an action and never undone
+
+MAX_UNDO = 100 # actions kept for undo, older ones are dropped
+
+def action_changes(action, row, other, forward=True):
+    """(row, alive) pairs an action sets, or the reverse of them when not forward"""
+    if action == ADD:
+        changes = ((added, True) for added in range(row, other))
+    elif action == EDIT:
+        changes = ((row, False), (other, True))
+    else: # DELETE and DEAD
+        changes = ((row, False),)
+    if forward:
+        return changes
+    return ((changed, not alive) for changed, alive in changes)
+
+def event_changes(event):
+    """(row, alive) pairs for one event record, every event says what it did so none of them need the stacks"""
+    operation, undone, row, other = event
+    if operation == UNDO:
+        return action_changes(undone, row, other, forward=False)
+    if operation == REDO:
+        return action_changes(undone, row, other)
+    if operation == ADD:
+        return () # rows are live from the moment they are appended, walking a big batch row by row would only slow it down
+    return action_changes(operation, row, other)
+
+def event_rows_valid(event, row_count):
+    """True if every row an event names exists, a crash can leave events for rows the ledger file never got"""
+    operation, undone, row, other = event
+    action = undone if operation in (UNDO, REDO) else operation
+    if action == ADD:
+        return row <= other <= row_count
+    if action == EDIT:
+        return row < row_count and other < row_count
+    return row < row_count
+
+class Undo_History:
+    """Undo and redo stacks of (action, row, other), kept in step with the events as they are applied"""
+    def __init__(self, undo_stack=(), redo_stack=()):
+        """Stacks restored from a snapshot, or empty"""
+        self.undo_stack = [tuple(action) for action in undo_stack]
+        self.redo_stack = [tuple(action) for action in redo_stack]
+
+    def record(self, event):
+        """Update the stacks for an event, in the same order the events were logged"""
+        operation, undone, row, other = event
+        if operation == UNDO:
+            if self.undo_stack:
+                self.redo_stack.append(self.undo_stack.pop())
+        elif operation == REDO:
+            if self.redo_stack:
+                self.undo_stack.append(self.redo_stack.pop())
+        elif operation != DEAD:
+            self.undo_stack.append((operation, row, other))
+            del self.undo_stack[:-MAX_UNDO]
+            self.redo_stack.clear() # a new action ends the redo chain
+
+    def undo_event(self):
+        """Event that undoes the newest action, None if there is nothing to undo"""
+        if self.undo_stack:
+            action, row, other = self.undo_stack[-1]
+            return (UNDO, action, row, other)
+        return None
+
+    def redo_event(self):
+        """Event that redoes the newest undone action, None if there is nothing to redo"""
+        if self.redo_stack:
+            action, row, other = self.redo_stack[-1]
+            return (REDO, action, row, other)
+        return None
+
+    def snapshot(self):
+        """Stacks as plain lists for the checkpoint"""
+        return {"undo": self.undo_stack, "redo": self.redo_stack}